@@ -8,3 +8,7 @@ celery_app = Celery(
 
 celery_app.conf.task_track_started = True
 celery_app.conf.result_expires = 3600
+# Fan-out subtasks acknowledge only after finishing, so a crashed worker's chunk is redelivered;
+# prefetching one message at a time spreads chunks evenly over the workers.
+celery_app.conf.task_reject_on_worker_lost = True
+celery_app.conf.worker_prefetch_multiplier = 1
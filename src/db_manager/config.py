@@ -7,3 +7,8 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = os.getenv("MONGO_DB_NAME", "resume_db")
 COLLECTION_NAME = os.getenv("MONGO_COLLECTION_NAME", "resumes")
+
+# Bulk ingestion tuning
+BULK_BATCH_SIZE = int(os.getenv("MONGO_BULK_BATCH_SIZE", "1000"))
+READ_WORKERS = int(os.getenv("MONGO_READ_WORKERS", "8"))
+FIND_BATCH_SIZE = int(os.getenv("MONGO_FIND_BATCH_SIZE", "500"))
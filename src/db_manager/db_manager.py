@@ -1,54 +1,464 @@
 import json
+import re
 import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from pymongo import MongoClient
-from config import MONGO_URI, DB_NAME, COLLECTION_NAME
+from pymongo import MongoClient, UpdateOne, ReplaceOne, IndexModel, ASCENDING, TEXT
+from pymongo.errors import BulkWriteError, OperationFailure
+from src.db_manager.config import MONGO_URI, DB_NAME, COLLECTION_NAME, BULK_BATCH_SIZE, READ_WORKERS, FIND_BATCH_SIZE
+
+MAX_REPORTED_ERRORS = 20
+# Fields that are added on ingest and must not feed back into a document's own key.
+DERIVED_FIELDS = ("_id", "candidate_key", "content_hash")
+# What --find prints when no --fields are given.
+LISTING_FIELDS = ("name", "email")
+
+
+def normalize_email(email):
+    return str(email or "").strip().lower()
+
+
+def normalize_phone(phone):
+    # Legacy documents may store the phone as a number.
+    digits = re.sub(r"\D", "", str(phone or ""))
+    # Compare on the national number, so "+91 98765 43210" and "098765-43210" are the same candidate.
+    return digits[-10:] if len(digits) >= 10 else digits
+
+
+def normalize_name(name):
+    return " ".join(str(name or "").lower().split())
+
+
+def candidate_key(doc: dict, source: str = None):
+    """Deterministic identity for a resume: normalized email, else phone, else name plus source file.
+
+    The source file's stem is the same at every pipeline stage, so re-standardizing or re-tiering
+    a resume without contact details still updates the same document. Only documents with neither
+    contact details nor a source fall back to a hash of their content.
+    """
+    email = normalize_email(doc.get("email"))
+    phone = normalize_phone(doc.get("phone"))
+    if email:
+        basis = f"email:{email}"
+    elif phone:
+        basis = f"phone:{phone}"
+    elif source:
+        basis = f"source:{normalize_name(doc.get('name'))}|{Path(source).stem}"
+    else:
+        content = {k: v for k, v in doc.items() if k not in DERIVED_FIELDS}
+        basis = "content:" + json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(basis.encode("utf-8")).hexdigest()
+
+
+def content_hash(doc: dict):
+    """Hash of the document's canonical JSON, ignoring ingest-added fields and key order."""
+    content = {k: v for k, v in doc.items() if k not in DERIVED_FIELDS}
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def upsert_spec(doc: dict, source: str = None):
+    """Filter and full replacement document for an upsert on candidate_key.
+
+    The replacement carries a new _id; replacement() swaps in the stored one when the key exists.
+    `source` is the file the document was read from, used for its key when it has no contact details.
+    """
+    fields = {k: v for k, v in doc.items() if k not in DERIVED_FIELDS}
+    fields["candidate_key"] = doc.get("candidate_key") or candidate_key(fields, source)
+    fields["content_hash"] = content_hash(fields)
+    _id = doc.get("_id") or str(uuid.uuid4())
+    return {"candidate_key": fields["candidate_key"]}, {**fields, "_id": _id}
+
+
+def replacement(document: dict, stored_id=None):
+    """The document to write in place of the stored one: keys the new version dropped are removed too."""
+    return {**document, "_id": stored_id} if stored_id is not None else document
+
+
+def new_summary():
+    return {"total": 0, "inserted": 0, "updated": 0, "unchanged": 0, "superseded": 0, "matched": 0, "failed": 0,
+            "errors": []}
+
+
+def stored_hashes_query(specs):
+    """The one $in lookup, with projection, that fetches stored _ids and content hashes for a batch of specs."""
+    keys = [query["candidate_key"] for _, query, _ in specs]
+    return {"candidate_key": {"$in": keys}}, {"_id": 1, "candidate_key": 1, "content_hash": 1}
+
+
+def changed_operations(specs, stored, summary):
+    """ReplaceOne operations and their sources for the specs whose content hash differs from `stored`.
+
+    `stored` maps candidate_key to the stored document's {"_id", "content_hash"}. Specs sharing a
+    candidate_key (the same candidate in two files) collapse to the one from the last source by name,
+    so a batch never inserts a key twice and repeated runs keep picking the same version.
+    """
+    winners = {}
+    for spec in specs:
+        key = spec[1]["candidate_key"]
+        if key not in winners or str(spec[0]) > str(winners[key][0]):
+            winners[key] = spec
+    summary["superseded"] += len(specs) - len(winners)
+
+    operations, sources = [], []
+    for source, query, document in winners.values():
+        current = stored.get(query["candidate_key"]) or {}
+        if current.get("content_hash") == document["content_hash"]:
+            summary["unchanged"] += 1
+            continue
+        operations.append(ReplaceOne(query, replacement(document, current.get("_id")), upsert=True))
+        sources.append(source)
+    return operations, sources
+
+
+def record_write(details, sources, summary):
+    """Fold a bulk_write result (or BulkWriteError details) into the ingest summary."""
+    for error in details.get("writeErrors", []):
+        summary["errors"].append({"source": sources[error["index"]], "error": error.get("errmsg")})
+    summary["failed"] += len(details.get("writeErrors", []))
+    summary["inserted"] += details.get("nUpserted", 0)
+    summary["updated"] += details.get("nModified", 0)
+    summary["matched"] += details.get("nMatched", 0)
+
+
+def print_summary(summary):
+    for error in summary["errors"][:MAX_REPORTED_ERRORS]:
+        print(f"❌ Failed to upsert {error['source']}: {error['error']}")
+    if len(summary["errors"]) > MAX_REPORTED_ERRORS:
+        print(f"... and {len(summary['errors']) - MAX_REPORTED_ERRORS} more failures")
+    print(f"\n📊 Summary: Total = {summary['total']}, Inserted = {summary['inserted']}, "
+          f"Updated = {summary['updated']}, Unchanged = {summary['unchanged']}, "
+          f"Superseded = {summary['superseded']}, Failed = {summary['failed']}")
+
 
 class ResumeDBManager:
+    UNIQUE_KEY_INDEX = "candidate_key_unique"
+    # Used instead of the unique index while legacy duplicates are unresolved, so upserts still use an index.
+    FALLBACK_KEY_INDEX = IndexModel([("candidate_key", ASCENDING)], name="candidate_key")
+    INDEXES = [
+        IndexModel([("candidate_key", ASCENDING)], name="candidate_key_unique", unique=True,
+                   partialFilterExpression={"candidate_key": {"$exists": True}}),
+        IndexModel([("skills", ASCENDING)], name="skills"),
+        IndexModel([("education.tier", ASCENDING)], name="education_tier"),
+        IndexModel([("location_tier", ASCENDING)], name="location_tier"),
+        IndexModel([("summary", TEXT)], name="summary_text"),
+    ]
+
     def __init__(self):
         self.client = MongoClient(MONGO_URI)
         self.db = self.client[DB_NAME]
         self.collection = self.db[COLLECTION_NAME]
+        self.indexes_ensured = False
+
+    def ensure_indexes(self, merge_duplicates=False):
+        """Create missing INDEXES and rebuild any whose definition changed. Other indexes are left alone.
+
+        Documents written before candidate keys existed may share an email or phone. Those duplicates
+        are reported and the unique index is deferred, or with `merge_duplicates` they are moved aside
+        first, so ingest keeps working either way.
+        """
+        self.backfill_candidate_keys()
+        existing = self.collection.index_information()
+        missing = []
+        for model in self.INDEXES:
+            spec = model.document
+            current = existing.get(spec["name"])
+            if current is None:
+                missing.append(model)
+                continue
+            text_fields = {field for field, kind in spec["key"].items() if kind == TEXT}
+            if text_fields:
+                # index_information reports text indexes by their internal _fts/_ftsx key; compare the weights.
+                key_matches = set(current.get("weights", {})) == text_fields
+            else:
+                key_matches = list(current["key"]) == list(spec["key"].items())
+            options_match = all(current.get(option) == spec.get(option)
+                                for option in ("unique", "partialFilterExpression"))
+            if not (key_matches and options_match):
+                print(f"🔁 Rebuilding index {spec['name']} (definition changed)")
+                self.collection.drop_index(spec["name"])
+                missing.append(model)
+
+        fallback_name = self.FALLBACK_KEY_INDEX.document["name"]
+        if any(model.document["name"] == self.UNIQUE_KEY_INDEX for model in missing):
+            duplicates = self.find_duplicate_keys()
+            if duplicates and merge_duplicates:
+                self.merge_duplicates(duplicates)
+            elif duplicates:
+                self.report_duplicates(duplicates)
+                missing = [model for model in missing if model.document["name"] != self.UNIQUE_KEY_INDEX]
+                if fallback_name not in existing:
+                    missing.append(self.FALLBACK_KEY_INDEX)
+        if fallback_name in existing and any(model.document["name"] == self.UNIQUE_KEY_INDEX for model in missing):
+            # The unique index is about to cover the same key.
+            self.collection.drop_index(fallback_name)
+
+        if missing:
+            try:
+                created = self.collection.create_indexes(missing)
+                print(f"✅ Created indexes: {', '.join(created)}")
+            except OperationFailure as e:
+                print(f"❌ Index creation failed: {e}")
+                raise
+        else:
+            print("✅ Indexes are up to date.")
+
+        managed = {model.document["name"] for model in self.INDEXES} | {fallback_name, "_id_"}
+        unmanaged = sorted(set(existing) - managed)
+        if unmanaged:
+            print(f"ℹ️ Unmanaged indexes left in place: {', '.join(unmanaged)}")
+        self.indexes_ensured = True
+
+    def check_indexes(self):
+        """Cheap pre-ingest check: create the indexes only if no candidate_key index exists yet.
+
+        Backfilling and drift repair need collection scans, so they only run from --ensure-indexes.
+        """
+        existing = self.collection.index_information()
+        if self.UNIQUE_KEY_INDEX not in existing and self.FALLBACK_KEY_INDEX.document["name"] not in existing:
+            try:
+                self.collection.create_indexes(self.INDEXES)
+            except OperationFailure as e:
+                print(f"⚠️ Could not create indexes ({e}); run `python -m src.db_manager.db_manager --ensure-indexes`.")
+        self.indexes_ensured = True
+
+    def backfill_candidate_keys(self, batch_size=None):
+        """Give documents written before candidate keys existed their key, so the unique index can cover them.
+
+        Only documents with an email or phone are keyed. Contactless ones are keyed by name plus source
+        file on ingest, and legacy documents do not record their source, so they are reported as
+        unresolved rather than given a key that a re-ingest of the same file would never match.
+        """
+        batch_size = batch_size or BULK_BATCH_SIZE
+        operations = []
+        updated = 0
+        unresolved = []
+        for doc in self.collection.find({"candidate_key": {"$exists": False}}):
+            if not (normalize_email(doc.get("email")) or normalize_phone(doc.get("phone"))):
+                unresolved.append(doc["_id"])
+                continue
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"candidate_key": candidate_key(doc)}}))
+            if len(operations) >= batch_size:
+                updated += self.collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            updated += self.collection.bulk_write(operations, ordered=False).modified_count
+        if updated:
+            print(f"🔑 Added candidate keys to {updated} existing resumes.")
+        if unresolved:
+            sample = ", ".join(str(_id) for _id in unresolved[:MAX_REPORTED_ERRORS])
+            print(f"⚠️ {len(unresolved)} existing resumes have no email or phone and were left without a "
+                  f"candidate key; re-ingest their source files and delete these documents: {sample}")
+        return updated
+
+    def find_duplicate_keys(self):
+        """Candidate keys held by more than one document, as [{"_id": key, "ids": [...], "count": n}]."""
+        return list(self.collection.aggregate([
+            {"$match": {"candidate_key": {"$exists": True}}},
+            {"$group": {"_id": "$candidate_key", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ], allowDiskUse=True))
+
+    def report_duplicates(self, duplicates):
+        extra = sum(group["count"] - 1 for group in duplicates)
+        print(f"⚠️ {len(duplicates)} candidate keys are shared by {extra} extra resumes; "
+              f"the unique {self.UNIQUE_KEY_INDEX} index is deferred until they are resolved.")
+        for group in duplicates[:MAX_REPORTED_ERRORS]:
+            print(f"- key {group['_id'][:12]}: {', '.join(str(_id) for _id in group['ids'])}")
+        if len(duplicates) > MAX_REPORTED_ERRORS:
+            print(f"... and {len(duplicates) - MAX_REPORTED_ERRORS} more keys")
+        print("➡️ Run `python -m src.db_manager.db_manager --ensure-indexes --merge-duplicates` to resolve them.")
+
+    def merge_duplicates(self, duplicates):
+        """Keep one document per candidate key and move the others to the `<collection>_duplicates` collection.
+
+        The kept document is the one last written by ingest (it has a content_hash), else the first by _id.
+        """
+        archive = self.db[f"{COLLECTION_NAME}_duplicates"]
+        moved = 0
+        for group in duplicates:
+            docs = sorted(self.collection.find({"_id": {"$in": group["ids"]}}),
+                          key=lambda doc: ("content_hash" not in doc, str(doc["_id"])))
+            kept, extras = docs[0], docs[1:]
+            if not extras:
+                continue
+            archive.insert_many([{**doc, "_id": str(uuid.uuid4()), "original_id": doc["_id"], "kept_id": kept["_id"]}
+                                 for doc in extras])
+            moved += self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in extras]}}).deleted_count
+        print(f"🧹 Moved {moved} duplicate resumes to {archive.name}.")
+        return moved
+
+    def insert_or_update_resume(self, resume: dict, source: str = None):
+        """Upsert a single resume by candidate key, using a UUID as the _id of new documents."""
+        query, document = upsert_spec(resume, source)
+        stored = self.collection.find_one(query, {"_id": 1})
+        result = self.collection.replace_one(query, replacement(document, stored and stored["_id"]), upsert=True)
+        if result.upserted_id is not None:
+            print(f"✅ Inserted document ID: {result.upserted_id}")
+        else:
+            print(f"✅ Updated resume with candidate key {query['candidate_key'][:12]}")
+        return result.upserted_id
+
+    @staticmethod
+    def read_json_file(file):
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                return file.name, json.load(f), None
+        except (OSError, ValueError) as e:
+            return file.name, None, str(e)
+
+    def flush_batch(self, specs, summary):
+        """Write the (source, filter, document) specs whose content hash differs from the stored one."""
+        query, projection = stored_hashes_query(specs)
+        stored = {doc["candidate_key"]: doc for doc in self.collection.find(query, projection)}
+        operations, sources = changed_operations(specs, stored, summary)
+        if not operations:
+            return
+        try:
+            details = self.collection.bulk_write(operations, ordered=False).bulk_api_result
+        except BulkWriteError as e:
+            # Unordered writes keep going past failures; the details still count everything that succeeded.
+            details = e.details
+        record_write(details, sources, summary)
+
+    def ingest(self, items, batch_size=None, summary=None, keyed_by_source=True):
+        """Upsert (source, doc) pairs in batches of `batch_size`, skipping documents whose content is unchanged.
 
-    def insert_or_update_resume(self, resume: dict):
-        """Insert a single resume using UUID as the unique _id."""
-        if "_id" not in resume:
-            resume["_id"] = str(uuid.uuid4())
-        result = self.collection.insert_one(resume)
-        print(f"✅ Inserted document ID: {result.inserted_id}")
-        return result.inserted_id
+        With `keyed_by_source`, each source is the document's file name and feeds its candidate key.
+        """
+        batch_size = batch_size or BULK_BATCH_SIZE
+        summary = summary or new_summary()
+        if not self.indexes_ensured:
+            # Without a candidate_key index every upsert would scan the collection.
+            self.check_indexes()
+        specs = []
+        for source, doc in items:
+            summary["total"] += 1
+            if not isinstance(doc, dict):
+                summary["failed"] += 1
+                summary["errors"].append({"source": source, "error": "document is not a JSON object"})
+                continue
+            try:
+                specs.append((source, *upsert_spec(doc, source if keyed_by_source else None)))
+            except (TypeError, ValueError) as e:
+                # One malformed document must not abort the rest of the run.
+                summary["failed"] += 1
+                summary["errors"].append({"source": source, "error": str(e)})
+                continue
+            if len(specs) >= batch_size:
+                self.flush_batch(specs, summary)
+                specs = []
+        if specs:
+            self.flush_batch(specs, summary)
+        return summary
 
-    def bulk_insert(self, folder_path: str):
-        """Upsert all JSON files in a folder with UUIDs."""
+    def bulk_insert_documents(self, docs, batch_size=None):
+        """Upsert already-loaded resume dicts in batches. Returns the ingest summary."""
+        summary = self.ingest(((f"document {i}", doc) for i, doc in enumerate(docs)), batch_size,
+                              keyed_by_source=False)
+        print_summary(summary)
+        return summary
+
+    def bulk_insert(self, folder_path: str, batch_size=None, workers=None):
+        """Upsert all JSON files in a folder, reading them in a thread pool and writing in batches."""
         folder = Path(folder_path)
-        files = list(folder.glob("*.json"))
+        # Sorted, so same-candidate files resolve to the same version on every run.
+        files = sorted(folder.glob("*.json"))
         print(f"📂 Found {len(files)} resumes to insert or update.\n")
 
-        inserted, failed = 0, 0
+        summary = new_summary()
 
-        for file in files:
-            try:
-                with open(file, "r", encoding="utf-8") as f:
-                    doc = json.load(f)
-                if "_id" not in doc:
-                    doc["_id"] = str(uuid.uuid4())
-                self.collection.replace_one({"name": doc["name"]}, doc, upsert=True)
-                print(f"✅ Upserted: {doc.get('name', 'Unknown')} ({file.name})")
-                inserted += 1
-            except Exception as e:
-                print(f"❌ Failed to upsert {file.name}: {e}")
-                failed += 1
-
-        print(f"\n📊 Summary: Total = {len(files)}, Upserted = {inserted}, Failed = {failed}")
-
-    def find(self, query: dict):
-        """Find resumes matching a query."""
+        def readable(results):
+            for name, doc, error in results:
+                if error:
+                    summary["total"] += 1
+                    summary["failed"] += 1
+                    summary["errors"].append({"source": name, "error": error})
+                    continue
+                yield name, doc
+
+        def read_all(pool):
+            # Read a few batches ahead at a time so a large folder is never held in memory at once.
+            window = (batch_size or BULK_BATCH_SIZE) * 4
+            for start in range(0, len(files), window):
+                yield from pool.map(self.read_json_file, files[start:start + window])
+
+        with ThreadPoolExecutor(max_workers=workers or READ_WORKERS) as pool:
+            self.ingest(readable(read_all(pool)), batch_size, summary)
+
+        print_summary(summary)
+        return summary
+
+    @staticmethod
+    def projection_for(fields):
+        """Turn a list of field names into a server-side projection; None returns whole documents."""
+        return {field: 1 for field in fields} if fields else None
+
+    def iter_resumes(self, query=None, fields=None, after=None, limit=None, batch_size=None, ordered=False):
+        """Lazily yield matching resumes, starting after the `after` _id.
+
+        Only `batch_size` documents are held client-side at a time; pass the last _id seen
+        as `after` to continue from where a previous page stopped. Results are sorted by _id
+        only for keyset paging (`after` given, or `ordered` for a first page), so a plain
+        filter can use its own index without an in-memory sort.
+        """
+        query = dict(query or {})
+        if after is not None:
+            query = {"$and": [query, {"_id": {"$gt": after}}]} if query else {"_id": {"$gt": after}}
+        cursor = self.collection.find(query, self.projection_for(fields)).batch_size(batch_size or FIND_BATCH_SIZE)
+        if ordered or after is not None:
+            cursor = cursor.sort("_id", ASCENDING)
+        if limit:
+            cursor = cursor.limit(limit)
+        with cursor:
+            yield from cursor
+
+    def find_page(self, query=None, fields=None, after=None, page_size=100):
+        """Return (documents, next `after` value or None) for one keyset page."""
+        docs = list(self.iter_resumes(query, fields, after=after, limit=page_size, batch_size=page_size, ordered=True))
+        next_after = docs[-1]["_id"] if len(docs) == page_size else None
+        return docs, next_after
+
+    def count(self, query=None):
+        return self.collection.count_documents(query or {})
+
+    def explain(self, query=None, fields=None, ordered=False):
+        """Summarize how the server would run `query`: plan stages, indexes used and documents examined."""
+        cursor = self.collection.find(query or {}, self.projection_for(fields))
+        plan = (cursor.sort("_id", ASCENDING) if ordered else cursor).explain()
+        stages, indexes = [], []
+        node = plan.get("queryPlanner", {}).get("winningPlan", {})
+        while node:
+            stages.append(node.get("stage"))
+            if node.get("indexName"):
+                indexes.append(node["indexName"])
+            node = node.get("inputStage") or (node.get("inputStages") or [None])[0] or node.get("queryPlan")
+        stats = plan.get("executionStats", {})
+        return {
+            "stages": [stage for stage in stages if stage],
+            "indexes": indexes,
+            "returned": stats.get("nReturned"),
+            "docs_examined": stats.get("totalDocsExamined"),
+            "keys_examined": stats.get("totalKeysExamined"),
+        }
+
+    def find(self, query: dict, fields=None, after=None, limit=None, batch_size=None):
+        """Print resumes matching a query as they stream in. Returns how many were printed."""
         print(f"🔍 Finding resumes matching: {query}")
-        results = list(self.collection.find(query))
-        print(f"🔎 Found {len(results)} resumes.\n")
-        for res in results:
-            print(f"- {res.get('name')} | {res.get('email')} | ID: {res.get('_id')}")
-        return results
+        fields = list(fields or LISTING_FIELDS)
+        found = 0
+        last_id = None
+        # A limited listing is a page the user may continue with --after, so it needs a stable order.
+        paged = bool(limit) or after is not None
+        for res in self.iter_resumes(query, fields, after=after, limit=limit, batch_size=batch_size, ordered=paged):
+            found += 1
+            last_id = res.get("_id")
+            print("- " + " | ".join(str(res.get(field)) for field in fields) + f" | ID: {last_id}")
+        print(f"\n🔎 Found {found} resumes.")
+        if limit and found == limit:
+            print(f"➡️ More may follow; continue with --after {last_id}")
+        return found
 
     def update_resume(self, update_data: dict):
         """Update a resume by _id."""
@@ -92,24 +502,44 @@ if __name__ == "__main__":
     parser.add_argument("--update", help="JSON string with _id and fields to update")
     parser.add_argument("--delete", help="JSON string with _id of resume to delete")
     parser.add_argument("--delete-all", action="store_true", help="Delete all resumes in the collection")
+    parser.add_argument("--ensure-indexes", action="store_true", help="Create or update the collection's indexes")
+    parser.add_argument("--merge-duplicates", action="store_true",
+                        help="With --ensure-indexes, move resumes sharing a candidate key aside before indexing")
+    parser.add_argument("--fields", help="Comma-separated fields to return for --find")
+    parser.add_argument("--limit", type=int, help="Maximum number of resumes to return for --find")
+    parser.add_argument("--after", help="Return --find results after this _id (keyset pagination)")
+    parser.add_argument("--count", action="store_true", help="Only count the resumes matching --find")
+    parser.add_argument("--explain", action="store_true", help="Show the query plan for --find instead of results")
+    parser.add_argument("--batch-size", type=int, help="Operations per bulk_write call for --folder, or cursor batch size for --find")
+    parser.add_argument("--workers", type=int, help="Threads reading JSON files for --folder")
 
     args = parser.parse_args()
     db = ResumeDBManager()
 
+    if args.ensure_indexes:
+        db.ensure_indexes(merge_duplicates=args.merge_duplicates)
+
     if args.file:
         with open(args.file, "r", encoding="utf-8") as f:
             doc = json.load(f)
-            db.insert_or_update_resume(doc)
+            db.insert_or_update_resume(doc, Path(args.file).name)
 
     elif args.folder:
-        db.bulk_insert(args.folder)
+        db.bulk_insert(args.folder, batch_size=args.batch_size, workers=args.workers)
 
     elif args.find:
         try:
             query = json.loads(args.find)
-            db.find(query)
         except Exception as e:
             print(f"❌ Invalid JSON for --find: {e}")
+        else:
+            fields = [f.strip() for f in args.fields.split(",") if f.strip()] if args.fields else None
+            if args.count:
+                print(f"🔎 {db.count(query)} resumes match {query}")
+            elif args.explain:
+                print(json.dumps(db.explain(query, fields, ordered=bool(args.limit) or args.after is not None), indent=2))
+            else:
+                db.find(query, fields, after=args.after, limit=args.limit, batch_size=args.batch_size)
 
     elif args.update:
         try:
@@ -127,5 +557,5 @@ if __name__ == "__main__":
     elif args.delete_all:
         db.delete_all_resumes()
 
-    else:
-        print("⚠️ Please provide one of --file, --folder, --find, --update, or --delete.")
+    elif not args.ensure_indexes:
+        print("⚠️ Please provide one of --file, --folder, --find, --update, --delete, or --ensure-indexes.")
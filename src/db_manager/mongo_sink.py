@@ -0,0 +1,124 @@
+import asyncio
+import os
+from pymongo import AsyncMongoClient
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from src.db_manager.config import MONGO_URI, DB_NAME, COLLECTION_NAME, BULK_BATCH_SIZE
+from src.db_manager.db_manager import (
+    ResumeDBManager, upsert_spec, new_summary, stored_hashes_query, changed_operations, record_write, print_summary
+)
+
+_CLOSE = object()
+
+
+class AsyncMongoSink:
+    """Buffers resumes from a pipeline stage and upserts them into Mongo in the background.
+
+    A batch is flushed once it reaches FLUSH_SIZE documents or FLUSH_INTERVAL seconds after its
+    first document arrived. put() waits while MAX_PENDING documents are queued, so a slow
+    database slows the producer down instead of growing memory. Writes use the same candidate
+    key and content-hash rules as ResumeDBManager.bulk_insert.
+    """
+
+    def __init__(self, collection=None):
+        self.FLUSH_SIZE = int(os.getenv("MONGO_SINK_FLUSH_SIZE", str(BULK_BATCH_SIZE)))
+        self.FLUSH_INTERVAL = float(os.getenv("MONGO_SINK_FLUSH_INTERVAL", "2"))
+        self.MAX_PENDING = int(os.getenv("MONGO_SINK_MAX_PENDING", str(self.FLUSH_SIZE * 4)))
+        self.client = None
+        self.collection = collection
+        self.queue = None
+        self.worker = None
+        self.summary = new_summary()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        if self.collection is None:
+            self.client = AsyncMongoClient(MONGO_URI)
+            self.collection = self.client[DB_NAME][COLLECTION_NAME]
+        try:
+            await self.collection.create_indexes(ResumeDBManager.INDEXES)
+        except OperationFailure as e:
+            print(f"⚠️ Could not create indexes ({e}); run `python -m src.db_manager.db_manager --ensure-indexes`.")
+        self.queue = asyncio.Queue(maxsize=self.MAX_PENDING)
+        self.worker = asyncio.create_task(self.drain())
+
+    async def put(self, doc: dict, source: str = None):
+        if self.worker.done():
+            # Surface a crashed writer instead of blocking forever on a full queue.
+            self.worker.result()
+        await self.queue.put((source, doc))
+
+    async def close(self):
+        if self.worker is None:
+            return
+        await self.queue.put(_CLOSE)
+        try:
+            await self.worker
+        finally:
+            self.worker = None
+            if self.client is not None:
+                await self.client.close()
+                self.client = None
+        if self.summary["total"]:
+            print_summary(self.summary)
+
+    async def drain(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await self.queue.get()
+            if item is _CLOSE:
+                return
+            batch = [item]
+            deadline = loop.time() + self.FLUSH_INTERVAL
+            while len(batch) < self.FLUSH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+            try:
+                await self.flush(batch)
+            except PyMongoError as e:
+                # Keep draining: the stage's other outputs are still written, and a re-run resends these.
+                self.summary["failed"] += len(batch)
+                self.summary["errors"].extend({"source": self.label(source, doc), "error": str(e)}
+                                              for source, doc in batch)
+
+    @staticmethod
+    def label(source, doc):
+        return source or doc.get("name") or "document"
+
+    async def flush(self, batch):
+        specs = []
+        for source, doc in batch:
+            self.summary["total"] += 1
+            try:
+                specs.append((self.label(source, doc), *upsert_spec(doc, source)))
+            except (TypeError, ValueError) as e:
+                self.summary["failed"] += 1
+                self.summary["errors"].append({"source": self.label(source, doc), "error": str(e)})
+        if not specs:
+            return
+
+        query, projection = stored_hashes_query(specs)
+        stored = {doc["candidate_key"]: doc async for doc in self.collection.find(query, projection)}
+        operations, sources = changed_operations(specs, stored, self.summary)
+        if not operations:
+            return
+        try:
+            details = (await self.collection.bulk_write(operations, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        record_write(details, sources, self.summary)
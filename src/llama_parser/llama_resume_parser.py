@@ -3,9 +3,14 @@ import json
 from pathlib import Path
 from dotenv import load_dotenv
 from llama_parse import LlamaParse
-import fitz  # PyMuPDF
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from src.utils.progress import update_progress
+from src.utils.progress import ProgressTracker
+from src.utils.disk_cache import DiskCache
+from src.llama_parser.local_extractor import assess_quality
+from src.llama_parser.pdf_analysis import analyze_pdf
 import asyncio
 class ResumeParser:
     def __init__(self):
@@ -23,33 +28,126 @@ class ResumeParser:
         self.RESUME_DIR = Path("data/resumes")
         self.OUTPUT_DIR = Path("data/llama_parse_resumes")
         self.SUPPORTED_EXTENSIONS = [".pdf", ".docx"]
+        self.MAX_IN_FLIGHT = int(os.getenv("LLAMA_PARSE_MAX_IN_FLIGHT", "8"))
+        self.PARSE_TIMEOUT = float(os.getenv("LLAMA_PARSE_TIMEOUT", "300"))
+        # "tiered" tries the local PyMuPDF text layer first; "llamaparse" sends every file to LlamaParse.
+        self.EXTRACTION_MODE = os.getenv("RESUME_EXTRACTION_MODE", "tiered")
+        self.LOCAL_WORKERS = int(os.getenv("LOCAL_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+        self.cache = DiskCache(
+            os.getenv("PARSE_CACHE_PATH", "data/parse_cache/index.sqlite"),
+            max_bytes=int(os.getenv("PARSE_CACHE_MAX_BYTES", str(2 * 1024 ** 3))),
+            max_age=float(os.getenv("PARSE_CACHE_MAX_AGE_DAYS", "180")) * 86400
+        )
+
+    def read_file(self, file_path):
+        data = file_path.read_bytes()
+        return data, hashlib.sha256(data).hexdigest()
+
+    def load_cached(self, file_path, digest):
+        cached = self.cache.get(digest)
+        if cached is None:
+            return None
+        parsed = json.loads(cached)
+        if self.EXTRACTION_MODE == "llamaparse" and parsed.get("extractor") == "pymupdf":
+            return None
+        parsed["file"] = file_path.name
+        return parsed
+
+    def store_cached(self, digest, parsed):
+        self.cache.set(digest, json.dumps(parsed, ensure_ascii=False))
  
-    def extract_links_with_fitz(self, file_path):
-        links = []
+    def analyze(self, file_path, data):
         try:
-            with fitz.open(file_path) as doc:
-                for page_number, page in enumerate(doc, start=1):
-                    for link in page.get_links():
-                        if "uri" in link:
-                            links.append({
-                                "text": page.get_textbox(link["from"]).strip(),
-                                "uri": link["uri"]
-                            })
+            return analyze_pdf(data)
         except Exception as e:
-            print(f"⚠️ Failed to extract links from {file_path.name}: {e}")
-        return links
+            print(f"⚠️ Failed to analyze {file_path.name}: {e}")
+            return None
+
+    async def aanalyze(self, file_path, data, pool=None):
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, analyze_pdf, data)
+        except Exception as e:
+            print(f"⚠️ Failed to analyze {file_path.name}: {e}")
+            return None
+
+    def extract_links_with_fitz(self, file_path, data=None):
+        analysis = self.analyze(file_path, data if data is not None else file_path.read_bytes())
+        return analysis["links"] if analysis else []
  
-    def parse_resume(self, file_path):
+    def accept_local_extraction(self, file_path, analysis):
+        """Return the locally extracted text if tiered mode is on and it passes the quality heuristic."""
+        if self.EXTRACTION_MODE != "tiered" or analysis is None:
+            return None
+        ok, reason = assess_quality(analysis["stats"])
+        if not ok:
+            print(f"↗️ Escalating {file_path.name} to LlamaParse ({reason})")
+            return None
+        print(f"⚡ Extracted {file_path.name} locally ({reason})")
+        return analysis["content"]
+
+    def build_parsed(self, file_path, digest, content, extractor, analysis=None):
+        parsed = {
+            "file": file_path.name,
+            "sha256": digest,
+            "content": content
+        }
+        if file_path.suffix.lower() == ".pdf":
+            parsed["links"] = analysis["links"] if analysis else []
+        if analysis:
+            parsed["page_count"] = analysis["page_count"]
+        parsed["extractor"] = extractor
+        return parsed
+
+    def parse_resume(self, file_path, data=None, digest=None):
+        try:
+            if data is None:
+                data, digest = self.read_file(file_path)
+            digest = digest or hashlib.sha256(data).hexdigest()
+            cached = self.load_cached(file_path, digest)
+            if cached:
+                return cached
+
+            analysis = self.analyze(file_path, data) if file_path.suffix.lower() == ".pdf" else None
+            content = self.accept_local_extraction(file_path, analysis)
+            extractor = "pymupdf" if content is not None else "llamaparse"
+            if content is None:
+                documents = self.parser.load_data(data, extra_info={"file_name": file_path.name})
+                content = "\n".join([doc.text for doc in documents])
+
+            parsed = self.build_parsed(file_path, digest, content, extractor, analysis)
+            self.store_cached(digest, parsed)
+            return parsed
+        except Exception as e:
+            print(f"❌ Failed to parse {file_path.name}: {e}")
+            return None
+
+    async def aparse_resume(self, file_path, data, digest, pool=None):
         try:
-            documents = self.parser.load_data(file_path)
-            combined_text = "\n".join([doc.text for doc in documents])
-            parsed = {
-                "file": file_path.name,
-                "content": combined_text
-            }
+            analysis, analysis_task = None, None
             if file_path.suffix.lower() == ".pdf":
-                parsed["links"] = self.extract_links_with_fitz(file_path)
+                analysis_task = asyncio.ensure_future(self.aanalyze(file_path, data, pool))
+                if self.EXTRACTION_MODE == "tiered":
+                    analysis = await analysis_task
+
+            content = self.accept_local_extraction(file_path, analysis)
+            extractor = "pymupdf" if content is not None else "llamaparse"
+            if content is None:
+                # The same in-memory buffer is uploaded, so the file is only read from disk once.
+                documents = await asyncio.wait_for(
+                    self.parser.aload_data(data, extra_info={"file_name": file_path.name}),
+                    timeout=self.PARSE_TIMEOUT
+                )
+                content = "\n".join([doc.text for doc in documents])
+
+            if analysis_task and analysis is None:
+                analysis = await analysis_task
+            parsed = self.build_parsed(file_path, digest, content, extractor, analysis)
+            await asyncio.to_thread(self.store_cached, digest, parsed)
             return parsed
+        except asyncio.TimeoutError:
+            print(f"⏱️ Timed out parsing {file_path.name} after {self.PARSE_TIMEOUT:.0f}s")
+            return None
         except Exception as e:
             print(f"❌ Failed to parse {file_path.name}: {e}")
             return None
@@ -59,69 +157,145 @@ class ResumeParser:
         with open(output_path, "w", encoding="utf-8") as f:
             json.dump(data, f, indent=2, ensure_ascii=False)
  
+    def read_existing_output(self, output_path):
+        try:
+            with open(output_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def claim_output_names(self, resume_files):
+        """Decide up front which file of each same-stem group owns the plain `{stem}.json` name.
+
+        The file whose content matches the existing output's sha256 keeps it, then the file the
+        existing output names, then the first file by name. The choice never depends on which
+        parse happens to finish first.
+        """
+        groups = {}
+        for resume in resume_files:
+            groups.setdefault(resume.stem, []).append(resume)
+
+        owners = {}
+        for stem, group in groups.items():
+            group = sorted(group, key=lambda f: f.name)
+            owners[stem] = group[0].name
+            if len(group) == 1:
+                continue
+            existing = self.read_existing_output(self.OUTPUT_DIR / f"{stem}.json") or {}
+            by_digest = {}
+            if existing.get("sha256"):
+                for resume in group:
+                    try:
+                        by_digest[self.read_file(resume)[1]] = resume.name
+                    except OSError:
+                        # An unreadable file fails on its own in process_resumes.
+                        continue
+            names = {resume.name for resume in group}
+            if existing.get("sha256") in by_digest:
+                owners[stem] = by_digest[existing["sha256"]]
+            elif existing.get("file") in names:
+                owners[stem] = existing["file"]
+        return owners
+
+    def resolve_output_path(self, resume, digest, owners):
+        """Pick the output file for a resume, avoiding collisions between sources sharing a stem.
+
+        `owners` comes from claim_output_names. Returns the path and whether it already holds this
+        exact file's parse result.
+        """
+        output_path = self.OUTPUT_DIR / f"{resume.stem}.json"
+        owner = owners.get(resume.stem, resume.name)
+        existing = self.read_existing_output(output_path)
+        if owner == resume.name and (existing is None or existing.get("file") == resume.name):
+            # Outputs written before hashing was introduced carry no sha256; trust them as before.
+            up_to_date = existing is not None and existing.get("sha256", digest) == digest
+            return output_path, up_to_date
+
+        output_path = self.OUTPUT_DIR / f"{resume.stem}-{digest[:12]}.json"
+        existing = self.read_existing_output(output_path)
+        return output_path, existing is not None and existing.get("sha256") == digest
+
+    def get_resume_files(self):
+        return [f for f in self.RESUME_DIR.iterdir() if f.suffix.lower() in self.SUPPORTED_EXTENSIONS]
+
+    async def process_resumes(self, resume_files, on_start=None, on_finish=None):
+        """Parse files concurrently, keeping at most MAX_IN_FLIGHT requests open."""
+        semaphore = asyncio.Semaphore(self.MAX_IN_FLIGHT)
+        owners = await asyncio.to_thread(self.claim_output_names, resume_files)
+        pool = None
+        # Daemonic processes (e.g. Celery prefork workers) cannot fork children; fall back to threads there.
+        if not multiprocessing.current_process().daemon:
+            pool = ProcessPoolExecutor(max_workers=self.LOCAL_WORKERS)
+
+        async def process(resume):
+            async with semaphore:
+                if on_start:
+                    on_start(resume)
+
+                try:
+                    data, digest = await asyncio.to_thread(self.read_file, resume)
+                    output_path, up_to_date = self.resolve_output_path(resume, digest, owners)
+                    cached = None if up_to_date else await asyncio.to_thread(self.load_cached, resume, digest)
+
+                    if up_to_date:
+                        print(f"⏩ Skipping {resume.name} (already processed)")
+                        status = "skipped"
+                    elif cached:
+                        await asyncio.to_thread(self.save_to_json, cached, output_path)
+                        print(f"♻️ Reused cached parse for {resume.name}: {output_path.name}")
+                        status = "cached"
+                    else:
+                        print(f"📄 Processing: {resume.name}")
+                        parsed = await self.aparse_resume(resume, data, digest, pool)
+                        if parsed:
+                            await asyncio.to_thread(self.save_to_json, parsed, output_path)
+                            print(f"✅ Saved: {output_path.name}")
+                            status = "done"
+                        else:
+                            status = "error"
+                except Exception as e:
+                    # Only this file fails; the rest of the run (or Celery chunk) carries on.
+                    print(f"❌ Failed to parse {resume.name}: {e}")
+                    status = "error"
+
+                if on_finish:
+                    on_finish(resume, status)
+                return status
+
+        try:
+            return await asyncio.gather(*(process(resume) for resume in resume_files))
+        finally:
+            if pool:
+                pool.shutdown()
+
     def run(self):
+        asyncio.run(self.arun())
+
+    async def arun(self):
         self.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        resume_files = [f for f in self.RESUME_DIR.iterdir() if f.suffix.lower() in self.SUPPORTED_EXTENSIONS]
+        resume_files = self.get_resume_files()
         print(f"🔍 Found {len(resume_files)} resume files to process.\n")
- 
-        for resume in resume_files:
-            output_path = self.OUTPUT_DIR / f"{resume.stem}.json"
-            if output_path.exists():
-                print(f"⏩ Skipping {resume.name} (already processed)")
-                continue
- 
-            print(f"📄 Processing: {resume.name}")
-            parsed_data = self.parse_resume(resume)
-            if parsed_data:
-                self.save_to_json(parsed_data, output_path)
-                print(f"✅ Saved: {output_path.name}")
-            print("-" * 40)
+        await self.process_resumes(resume_files)
 
     def run_with_progress(self, task_id: str):
+        asyncio.run(self.arun_with_progress(task_id))
+
+    async def arun_with_progress(self, task_id: str):
         self.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-        resume_files = [f for f in self.RESUME_DIR.iterdir() if f.suffix.lower() in self.SUPPORTED_EXTENSIONS]
-
-        total = len(resume_files)
-        parsed_count = 0
-        file_statuses = []
-        started_at = datetime.utcnow().isoformat()
-
-        for i, resume in enumerate(resume_files):
-            current_file = resume.name
-            current = {"name": current_file, "status": "processing"}
-
-            update_progress(task_id, {
-                "task_id": task_id,
-                "status": "in_progress",
-                "total": total,
-                "completed": parsed_count,
-                "current_file": current_file,
-                "files": file_statuses + [current],
-                "started_at": started_at,
-            })
-
-            output_path = self.OUTPUT_DIR / f"{resume.stem}.json"
-            if output_path.exists():
-                current["status"] = "skipped"
-            else:
-                parsed = self.parse_resume(resume)
-                if parsed:
-                    self.save_to_json(parsed, output_path)
-                    current["status"] = "done"
-                    parsed_count += 1
-                else:
-                    current["status"] = "error"
-
-            file_statuses.append(current)
-
-        update_progress(task_id, {
-            "task_id": task_id,
-            "status": "done",
-            "total": total,
-            "completed": parsed_count,
-            "files": file_statuses,
-            "finished_at": datetime.utcnow().isoformat()
-        })
+        resume_files = self.get_resume_files()
+
+        progress = ProgressTracker(task_id)
+        progress.start(total=len(resume_files), started_at=datetime.utcnow().isoformat())
+
+        def on_start(resume):
+            progress.file_started(resume.name)
+
+        def on_finish(resume, status):
+            progress.file_finished(resume.name, status, counted=status in ("done", "cached"))
+
+        await self.process_resumes(resume_files, on_start=on_start, on_finish=on_finish)
+
+        progress.finish("done", finished_at=datetime.utcnow().isoformat())
 
 if __name__ == "__main__":
     ResumeParser().run()
\ No newline at end of file
@@ -0,0 +1,86 @@
+import re
+import fitz  # PyMuPDF
+
+# Thresholds for accepting a PyMuPDF text layer instead of sending the file to LlamaParse.
+MIN_CHARS_PER_PAGE = 200
+MIN_TEXT_PAGE_RATIO = 0.8
+MAX_GARBAGE_RATIO = 0.02
+MIN_ALPHA_RATIO = 0.55
+MAX_IMAGE_COVERAGE = 0.6
+
+CID_PATTERN = re.compile(r"\(cid:\d+\)")
+
+
+def is_garbage_char(ch):
+    code = ord(ch)
+    if ch == "\ufffd" or 0xE000 <= code <= 0xF8FF:
+        return True
+    return code < 32 and ch not in "\n\r\t"
+
+
+def has_columns(blocks, page_width):
+    """Detect side-by-side text columns from block bounding boxes."""
+    middle = page_width / 2
+    left = [b for b in blocks if b[2] <= middle + page_width * 0.05 and (b[2] - b[0]) < page_width * 0.55]
+    right = [b for b in blocks if b[0] >= middle - page_width * 0.05 and (b[2] - b[0]) < page_width * 0.55]
+    if len(left) < 3 or len(right) < 3:
+        return False
+    top = max(min(b[1] for b in left), min(b[1] for b in right))
+    bottom = min(max(b[3] for b in left), max(b[3] for b in right))
+    shortest = min(max(b[3] for b in left) - min(b[1] for b in left),
+                   max(b[3] for b in right) - min(b[1] for b in right))
+    return shortest > 0 and (bottom - top) / shortest > 0.5
+
+
+def page_image_coverage(page):
+    page_area = abs(page.rect)
+    if not page_area:
+        return 0.0
+    covered = 0.0
+    for info in page.get_image_info():
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return min(covered / page_area, 1.0)
+
+
+def empty_text_stats():
+    return {"page_count": 0, "text_pages": 0, "chars": 0, "garbage_chars": 0,
+            "alpha_chars": 0, "column_pages": 0, "image_pages": 0}
+
+
+def extract_page_text(page, stats):
+    """Return the page's text layer in reading order and add its counts to `stats`."""
+    blocks = [b for b in page.get_text("blocks", sort=True) if b[6] == 0 and b[4].strip()]
+    text = "\n\n".join(b[4].strip() for b in blocks)
+    text = CID_PATTERN.sub("\ufffd", text)
+
+    visible = [ch for ch in text if not ch.isspace()]
+    stats["page_count"] += 1
+    stats["chars"] += len(visible)
+    stats["garbage_chars"] += sum(1 for ch in visible if is_garbage_char(ch))
+    stats["alpha_chars"] += sum(1 for ch in visible if ch.isalpha())
+    if len(visible) >= MIN_CHARS_PER_PAGE / 4:
+        stats["text_pages"] += 1
+    if has_columns([b[:4] for b in blocks], page.rect.width):
+        stats["column_pages"] += 1
+    if page_image_coverage(page) > MAX_IMAGE_COVERAGE:
+        stats["image_pages"] += 1
+    return text
+
+
+def assess_quality(stats):
+    """Return (ok, reason); ok means the local text layer is good enough to skip LlamaParse."""
+    page_count = stats["page_count"] or 1
+    chars = stats["chars"]
+    if chars < MIN_CHARS_PER_PAGE * page_count:
+        return False, "sparse text layer"
+    if stats["text_pages"] / page_count < MIN_TEXT_PAGE_RATIO:
+        return False, "pages without text"
+    if stats["image_pages"]:
+        return False, "image-heavy pages"
+    if stats["column_pages"]:
+        return False, "multi-column layout"
+    if stats["garbage_chars"] / chars > MAX_GARBAGE_RATIO:
+        return False, "garbled glyphs"
+    if stats["alpha_chars"] / chars < MIN_ALPHA_RATIO:
+        return False, "garbled glyphs"
+    return True, "clean text layer"
@@ -0,0 +1,45 @@
+import fitz  # PyMuPDF
+from src.llama_parser.local_extractor import empty_text_stats, extract_page_text
+
+
+def anchor_text(words, rect):
+    """Join the words whose boxes fall mostly inside a link rectangle."""
+    picked = []
+    for w in words:
+        word_rect = fitz.Rect(w[:4])
+        area = abs(word_rect)
+        if area and abs(word_rect & rect) / area > 0.5:
+            picked.append(w[4])
+    return " ".join(picked).strip()
+
+
+def analyze_pdf(data):
+    """Walk an in-memory PDF once, collecting links, anchor text, page count and text-layer stats.
+
+    Runs in a worker process, so it takes and returns plain picklable values.
+    """
+    links = []
+    pages = []
+    stats = empty_text_stats()
+
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        for page in doc:
+            pages.append(extract_page_text(page, stats))
+
+            uri_links = [link for link in page.get_links() if "uri" in link]
+            if not uri_links:
+                continue
+            # One word extraction per page instead of a get_textbox call per link.
+            words = page.get_text("words")
+            for link in uri_links:
+                links.append({
+                    "text": anchor_text(words, link["from"]),
+                    "uri": link["uri"]
+                })
+
+    return {
+        "page_count": stats["page_count"],
+        "links": links,
+        "content": "\n\n".join(pages).strip(),
+        "stats": stats
+    }
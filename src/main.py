@@ -1,12 +1,37 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import json
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from celery.result import AsyncResult
 
 from src.celery_app import celery_app
-from src.tasks import parser_tasks, standardizer_tasks
-from src.utils.progress import get_progress
+from src.tasks import parser_tasks, standardizer_tasks, tier_tasks
+from src.utils.progress import get_progress, progress_events, PENDING_TIMEOUT_SECONDS
 app = FastAPI()
 
+# Server-side JavaScript operators are not accepted from query strings.
+BLOCKED_OPERATORS = {"$where", "$function", "$accumulator"}
+_db = None
+
+
+def get_db():
+    global _db
+    if _db is None:
+        from src.db_manager.db_manager import ResumeDBManager
+        _db = ResumeDBManager()
+    return _db
+
+
+def check_filter(value):
+    if isinstance(value, dict):
+        for key, sub in value.items():
+            if key in BLOCKED_OPERATORS:
+                raise HTTPException(status_code=400, detail=f"Operator {key} is not allowed")
+            check_filter(sub)
+    elif isinstance(value, list):
+        for sub in value:
+            check_filter(sub)
+
 @app.post("/parse")
 def trigger_parse():
     task = parser_tasks.parse_resumes_task.delay()
@@ -17,6 +42,11 @@ def trigger_standardize():
     task = standardizer_tasks.standardize_resumes_task.delay()
     return {"task_id": task.id}
 
+@app.post("/tier")
+def trigger_tier():
+    task = tier_tasks.assign_tiers_task.delay()
+    return {"task_id": task.id}
+
 @app.get("/status/{task_id}")
 def check_status(task_id: str):
     task_result = AsyncResult(task_id, app=celery_app)
@@ -25,11 +55,58 @@ def check_status(task_id: str):
         "status": task_result.status,
     }
     if task_result.status == "SUCCESS":
-        response["result"] = task_result.result
+        result = task_result.result
+        if isinstance(result, dict) and result.get("callback_id"):
+            # A fan-out job: its own task only dispatched chunks; report the chord and the aggregated counters.
+            callback = AsyncResult(result["callback_id"], app=celery_app)
+            progress = get_progress(task_id, limit=0)
+            response["status"] = callback.status if callback.status in ("SUCCESS", "FAILURE") else "PROGRESS"
+            response["chunks"] = result["chunks"]
+            response["total"] = progress.get("total")
+            response["completed"] = progress.get("completed")
+            if callback.status == "SUCCESS":
+                response["result"] = callback.result
+            elif callback.status == "FAILURE":
+                response["error"] = str(callback.result)
+        else:
+            response["result"] = result
     elif task_result.status == "FAILURE":
         response["error"] = str(task_result.result)
     return response
 
 @app.get("/progress/{task_id}")
-def get_progress_status(task_id: str):
-    return get_progress(task_id)
+def get_progress_status(task_id: str, offset: int = Query(0, ge=0), limit: Optional[int] = Query(1000, ge=0)):
+    return get_progress(task_id, offset=offset, limit=limit)
+
+@app.get("/progress/{task_id}/events")
+def stream_progress_events(task_id: str, limit: Optional[int] = Query(1000, ge=0)):
+    """Push progress as server-sent events instead of polling /progress/{task_id}."""
+    # A finished task with no progress left has expired; don't wait for it to start.
+    finished = AsyncResult(task_id, app=celery_app).ready()
+    return StreamingResponse(
+        progress_events(task_id, limit=limit, pending_timeout=0 if finished else PENDING_TIMEOUT_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/resumes")
+def list_resumes(q: Optional[str] = None, fields: Optional[str] = None, after: Optional[str] = None,
+                 limit: Optional[int] = Query(None, ge=1), batch_size: Optional[int] = Query(None, ge=1)):
+    """Stream matching resumes as NDJSON. With `limit` or `after` they come in _id order; pass the
+    last _id back as `after` for the next page."""
+    try:
+        query = json.loads(q) if q else {}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON for q: {e}")
+    if not isinstance(query, dict):
+        raise HTTPException(status_code=400, detail="q must be a JSON object")
+    check_filter(query)
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+    def stream():
+        paged = limit is not None or after is not None
+        for doc in get_db().iter_resumes(query, field_list, after=after, limit=limit, batch_size=batch_size,
+                                         ordered=paged):
+            yield json.dumps(doc, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+import httpx
+
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class AzureBatchTransport:
+    """Azure OpenAI Files + Batch API client.
+
+    Any object exposing the same coroutines can be passed to BatchStandardizer instead,
+    e.g. one pointed at a local stand-in server.
+    """
+
+    def __init__(self, endpoint, api_key, api_version, client=None):
+        self.endpoint = endpoint.rstrip("/")
+        self.api_version = api_version
+        self.headers = {"api-key": api_key}
+        self.client = client or httpx.AsyncClient(timeout=httpx.Timeout(120, connect=10))
+
+    def url(self, path):
+        return f"{self.endpoint}/openai/{path}?api-version={self.api_version}"
+
+    async def upload_file(self, path: Path) -> str:
+        response = await self.client.post(
+            self.url("files"),
+            headers=self.headers,
+            data={"purpose": "batch"},
+            files={"file": (path.name, path.read_bytes(), "application/jsonl")}
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def create_batch(self, input_file_id: str) -> dict:
+        response = await self.client.post(
+            self.url("batches"),
+            headers=self.headers,
+            json={
+                "input_file_id": input_file_id,
+                "endpoint": "/chat/completions",
+                "completion_window": "24h"
+            }
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def get_batch(self, batch_id: str) -> dict:
+        response = await self.client.get(self.url(f"batches/{batch_id}"), headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def iter_file_lines(self, file_id: str):
+        async with self.client.stream("GET", self.url(f"files/{file_id}/content"), headers=self.headers) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.strip():
+                    yield line
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class BatchState:
+    """On-disk checkpoint of submitted batches, so a restart resumes instead of resubmitting."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"batches": []}
+
+    @property
+    def batches(self):
+        return self.data["batches"]
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+
+class BatchStandardizer:
+    """Runs a ResumeStandardizer's requests as Batch API jobs: build JSONL, submit, poll, ingest."""
+
+    def __init__(self, standardizer, transport=None):
+        self.standardizer = standardizer
+        self.BATCH_DIR = Path(os.getenv("BATCH_DIR", "data/standardizer_batches"))
+        self.MAX_REQUESTS_PER_BATCH = int(os.getenv("BATCH_MAX_REQUESTS", "50000"))
+        self.POLL_INTERVAL = float(os.getenv("BATCH_POLL_INTERVAL", "60"))
+        self.state = BatchState(self.BATCH_DIR / "state.json")
+        self.owns_transport = transport is None
+        self.transport = transport or AzureBatchTransport(
+            os.getenv("AZURE_OPENAI_BATCH_ENDPOINT", standardizer.endpoint),
+            standardizer.api_key,
+            standardizer.api_version
+        )
+
+    async def run(self):
+        try:
+            if self.state.batches:
+                print(f"🔁 Resuming {len(self.state.batches)} batch job(s) from {self.state.path}")
+            else:
+                for file, parsed_json in await asyncio.to_thread(self.build_batches):
+                    await self.standardizer.publish(file, parsed_json)
+
+            for batch in self.state.batches:
+                if batch.get("done"):
+                    continue
+                await self.submit(batch)
+                await self.wait(batch)
+                await self.ingest(batch)
+
+            self.state.clear()
+        finally:
+            if self.owns_transport:
+                await self.transport.aclose()
+
+    def build_batches(self):
+        """Write batch input files for uncached requests. Returns (file, document) pairs served from cache."""
+        standardizer = self.standardizer
+        files = sorted(standardizer.INPUT_DIR.glob("*.json"))
+        print(f"📂 Found {len(files)} resumes for batch standardization.\n")
+
+        pending = []
+        from_cache = []
+        for file in files:
+            request = standardizer.prepare_request(file)
+            if request is None:
+                continue
+            cached = standardizer.response_cache.get(request["cache_key"])
+            if cached is not None:
+                try:
+                    parsed_json, invalid = standardizer.parse_response(cached)
+                    if not invalid:
+                        standardizer.save_response(file, cached, parsed_json)
+                        from_cache.append((file, parsed_json))
+                        continue
+                except ValueError as e:
+                    print(f"⚠️ Cached response for {file.name} is unusable, resubmitting: {e}")
+            pending.append((file, request))
+
+        self.BATCH_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        for start in range(0, len(pending), self.MAX_REQUESTS_PER_BATCH):
+            chunk = pending[start:start + self.MAX_REQUESTS_PER_BATCH]
+            input_path = self.BATCH_DIR / f"batch-{stamp}-{start // self.MAX_REQUESTS_PER_BATCH}.jsonl"
+            requests = {}
+            with open(input_path, "w", encoding="utf-8") as f:
+                for file, request in chunk:
+                    body = standardizer.build_request_body(request["prompt"], request["max_tokens"])
+                    body["model"] = standardizer.deployment
+                    line = {"custom_id": file.name, "method": "POST", "url": "/chat/completions", "body": body}
+                    f.write(json.dumps(line, ensure_ascii=False) + "\n")
+                    requests[file.name] = {"file": file.name, "cache_key": request["cache_key"],
+                                           "max_tokens": request["max_tokens"]}
+            self.state.batches.append({"input_path": str(input_path), "requests": requests, "ingested": []})
+            print(f"📝 Wrote {len(chunk)} requests to {input_path.name}")
+
+        self.state.save()
+        return from_cache
+
+    async def submit(self, batch):
+        if not batch.get("input_file_id"):
+            batch["input_file_id"] = await self.transport.upload_file(Path(batch["input_path"]))
+            self.state.save()
+        if not batch.get("batch_id"):
+            created = await self.transport.create_batch(batch["input_file_id"])
+            batch["batch_id"] = created["id"]
+            batch["status"] = created.get("status")
+            self.state.save()
+            print(f"🚀 Submitted batch {batch['batch_id']} ({len(batch['requests'])} requests)")
+
+    async def wait(self, batch):
+        while batch.get("status") not in TERMINAL_STATUSES:
+            info = await self.transport.get_batch(batch["batch_id"])
+            batch["status"] = info.get("status")
+            batch["output_file_id"] = info.get("output_file_id")
+            batch["error_file_id"] = info.get("error_file_id")
+            self.state.save()
+            if batch["status"] in TERMINAL_STATUSES:
+                break
+            counts = info.get("request_counts") or {}
+            print(f"⏳ Batch {batch['batch_id']}: {batch['status']} "
+                  f"({counts.get('completed', 0)}/{counts.get('total', len(batch['requests']))} done)")
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def ingest(self, batch):
+        standardizer = self.standardizer
+        ingested = set(batch["ingested"])
+        saved, failed = 0, 0
+
+        # Expired or cancelled batches can still carry partial output.
+        if batch.get("output_file_id"):
+            async for line in self.transport.iter_file_lines(batch["output_file_id"]):
+                item = json.loads(line)
+                custom_id = item.get("custom_id")
+                request = batch["requests"].get(custom_id)
+                if request is None or custom_id in ingested:
+                    continue
+
+                file_path = standardizer.INPUT_DIR / request["file"]
+                response = item.get("response") or {}
+                try:
+                    if response.get("status_code") != 200:
+                        raise RuntimeError(f"HTTP {response.get('status_code')}: {item.get('error')}")
+                    choice = response["body"]["choices"][0]
+                    raw_response = choice["message"]["content"]
+                    if standardizer.truncated(choice.get("finish_reason"), {"max_tokens": request.get("max_tokens", 0)}):
+                        # Cut off by the budgeted max_tokens; ask again online with the full cap.
+                        retry = await asyncio.to_thread(standardizer.load_request, file_path)
+                        raw_response = await standardizer.call_azure_llm(retry["prompt"], standardizer.MAX_TOKENS)
+                    parsed_json = await standardizer.resolve_response(file_path, raw_response)
+                    await asyncio.to_thread(standardizer.save_response, file_path, raw_response, parsed_json,
+                                            request["cache_key"])
+                    await standardizer.publish(file_path, parsed_json)
+                    saved += 1
+                except Exception as e:
+                    print(f"❌ Failed to standardize {request['file']}: {e}")
+                    failed += 1
+
+                ingested.add(custom_id)
+                if len(ingested) % 100 == 0:
+                    batch["ingested"] = sorted(ingested)
+                    self.state.save()
+
+        errored = set()
+        if batch.get("error_file_id"):
+            async for line in self.transport.iter_file_lines(batch["error_file_id"]):
+                item = json.loads(line)
+                custom_id = item.get("custom_id")
+                if custom_id in ingested or custom_id in errored:
+                    continue
+                print(f"❌ Batch request {custom_id} failed: {item.get('error') or item.get('response')}")
+                errored.add(custom_id)
+                failed += 1
+
+        missing = len(batch["requests"]) - len(ingested) - len(errored)
+        batch["ingested"] = sorted(ingested)
+        batch["done"] = True
+        self.state.save()
+        print(f"📊 Batch {batch['batch_id']} ({batch['status']}): saved = {saved}, failed = {failed}, "
+              f"not returned = {missing}. Unsaved resumes are picked up by the next run.")
@@ -0,0 +1,106 @@
+import re
+from functools import lru_cache
+
+MARKDOWN_LINK = re.compile(r"\[([^\]]*)\]\(([^)\s]+)\)")
+MARKDOWN_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+EMPHASIS = re.compile(r"(\*\*|__)(.+?)\1")
+HORIZONTAL_RULE = re.compile(r"^\s*([-*_=]\s*){3,}$")
+TABLE_SEPARATOR = re.compile(r"^\s*\|?(\s*:?-{2,}:?\s*\|)+\s*:?-*:?\s*\|?\s*$")
+INLINE_WHITESPACE = re.compile(r"[ \t\u00a0]+")
+EMPTY_TABLE_CELLS = re.compile(r"(\|\s*){2,}")
+
+
+def normalize_uri(uri):
+    return uri.strip().rstrip("/").lower()
+
+
+def compact_content(content, links=None):
+    """Strip markdown noise and repeated lines from LlamaParse output before it is sent to the model.
+
+    Only consecutive repeats are collapsed: the same bullet under two different jobs is real content.
+    """
+    known_uris = {normalize_uri(link.get("uri", "")) for link in links or []}
+    anchors = {(link.get("text") or "").strip() for link in links or []}
+
+    def replace_link(match):
+        text, uri = match.group(1).strip(), match.group(2)
+        # The URI is already in the hyperlink list, so the anchor text is enough here.
+        if normalize_uri(uri) in known_uris:
+            replacement = text
+        else:
+            replacement = f"{text} ({uri})" if text and text != uri else uri
+        anchors.add(replacement)
+        return replacement
+
+    text = HTML_COMMENT.sub("", content.replace("\r\n", "\n").replace("\r", "\n"))
+    text = MARKDOWN_IMAGE.sub("", text)
+    text = MARKDOWN_LINK.sub(replace_link, text)
+    text = EMPHASIS.sub(r"\2", text)
+    # LlamaParse often repeats the anchor text of embedded links ("GitHub GitHub").
+    for anchor in sorted((a for a in anchors if a), key=len, reverse=True):
+        escaped = re.escape(anchor)
+        text = re.sub(rf"(?<!\w){escaped}(?:[ \t]+{escaped})+(?!\w)", anchor, text)
+
+    lines = []
+    previous = None
+    for line in text.split("\n"):
+        line = INLINE_WHITESPACE.sub(" ", line).strip()
+        if HORIZONTAL_RULE.match(line) or TABLE_SEPARATOR.match(line):
+            continue
+        line = EMPTY_TABLE_CELLS.sub("| ", line).strip()
+        if line in ("|", "| |"):
+            line = ""
+
+        key = line.lower()
+        if line and key == previous:
+            continue
+        if not line and (not lines or not lines[-1]):
+            continue
+        lines.append(line)
+        previous = key
+
+    return "\n".join(lines).strip()
+
+
+def compact_links(links):
+    """Drop duplicate URIs, keeping the first non-empty anchor text seen for each."""
+    compacted = {}
+    for link in links or []:
+        uri = (link.get("uri") or "").strip()
+        if not uri:
+            continue
+        text = INLINE_WHITESPACE.sub(" ", link.get("text") or "").strip()
+        key = normalize_uri(uri)
+        if key not in compacted:
+            compacted[key] = {"text": text, "uri": uri}
+        elif not compacted[key]["text"] and text:
+            compacted[key]["text"] = text
+    return list(compacted.values())
+
+
+def format_links(links):
+    """One `anchor text -> URI` line per link instead of pretty-printed JSON."""
+    if not links:
+        return "(none)"
+    return "\n".join(f"{link['text']} -> {link['uri']}" if link["text"] else link["uri"] for link in links)
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when installed, otherwise estimate ~4 characters per token."""
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
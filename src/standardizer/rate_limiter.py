@@ -0,0 +1,138 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucket:
+    """Budget of `per_minute` units that refills continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(float(amount), self.capacity)
+        # Waiters queue on the lock, so they are served in order instead of all waking at once.
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def sync_remaining(self, remaining):
+        """Never assume more budget than the server says is left."""
+        self._refill()
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class AdaptiveConcurrency:
+    """AIMD concurrency limit: grow by ~1 per window of successes, halve on throttling."""
+
+    def __init__(self, maximum, minimum=1, initial=None, cooldown=2.0):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial or max(minimum, maximum // 2))
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def increase(self):
+        self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+
+    def decrease(self):
+        now = time.monotonic()
+        # One burst of 429s should only halve the window once.
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit / 2)
+
+
+class RateLimitScheduler:
+    """Admission control for Azure OpenAI calls within the deployment's RPM/TPM quota."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_concurrency,
+                 max_retries=8, base_delay=1.0, max_delay=60.0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens):
+        await self.concurrency.acquire()
+        try:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.requests.acquire(1)
+            await self.tokens.acquire(estimated_tokens)
+            yield
+        finally:
+            await self.concurrency.release()
+
+    def observe(self, headers):
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_requests is not None:
+            self.requests.sync_remaining(remaining_requests)
+        if remaining_tokens is not None:
+            self.tokens.sync_remaining(remaining_tokens)
+
+    def on_success(self):
+        self.concurrency.increase()
+
+    def on_throttle(self, delay):
+        self.concurrency.decrease()
+        self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+    def backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def retry_delay(self, headers, attempt):
+        """Prefer the server's Retry-After hint, falling back to jittered exponential backoff."""
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return min(self.max_delay, float(retry_after_ms) / 1000) + random.uniform(0, self.base_delay)
+            except ValueError:
+                pass
+        retry_after = headers.get("retry-after")
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                try:
+                    seconds = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    seconds = None
+            if seconds is not None:
+                return min(self.max_delay, max(seconds, 0.0)) + random.uniform(0, self.base_delay)
+        return self.backoff(attempt)
@@ -0,0 +1,306 @@
+import json
+import re
+
+# The standardized structure requested in ResumeStandardizer._prompt_template.
+# "string" / "year" (str or int) are scalars, [spec] is a list of spec, and keys ending in "?" are optional.
+RESUME_SCHEMA = {
+    "name": "string",
+    "email": "string",
+    "phone": "string",
+    "location": "string",
+    "summary": "string",
+    "education": [{"degree": "string", "institution": "string", "year": "year"}],
+    "experience": [{"title": "string", "company": "string", "duration": "string",
+                    "location?": "string", "description": "string"}],
+    "skills": ["string"],
+    "projects": [{"title": "string", "description": "string", "link?": "string"}],
+    "certifications": [{"title": "string", "issuer?": "string", "year?": "year", "link?": "string"}],
+    "languages": ["string"],
+    "social_profiles": [{"platform": "string", "link": "string"}],
+}
+
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+SECTION_KEY = re.compile(r'\s*,?\s*"((?:[^"\\]|\\.)*)"\s*:\s*')
+NEXT_KEY = re.compile(r'\s*"(?:[^"\\]|\\.)*"\s*:')
+
+
+def field_name(key):
+    return key.rstrip("?")
+
+
+def compile_spec(spec):
+    """Turn a schema spec into a `check(value, path) -> [errors]` closure, once, up front."""
+    if spec == "string":
+        def check(value, path):
+            return [] if isinstance(value, str) else [f"{path}: expected string"]
+        return check
+
+    if spec == "year":
+        def check(value, path):
+            ok = isinstance(value, str) or (isinstance(value, int) and not isinstance(value, bool))
+            return [] if ok else [f"{path}: expected string or int"]
+        return check
+
+    if isinstance(spec, list):
+        check_item = compile_spec(spec[0])
+
+        def check(value, path):
+            if not isinstance(value, list):
+                return [f"{path}: expected list"]
+            errors = []
+            for i, item in enumerate(value):
+                errors.extend(check_item(item, f"{path}[{i}]"))
+            return errors
+        return check
+
+    fields = [(field_name(key), key.endswith("?"), compile_spec(sub)) for key, sub in spec.items()]
+
+    def check(value, path):
+        if not isinstance(value, dict):
+            return [f"{path}: expected object"]
+        errors = []
+        for name, optional, check_field in fields:
+            if name not in value:
+                if not optional:
+                    errors.append(f"{path}.{name}: missing")
+                continue
+            if optional and value[name] is None:
+                continue
+            errors.extend(check_field(value[name], f"{path}.{name}"))
+        return errors
+    return check
+
+
+SECTION_VALIDATORS = {field_name(key): compile_spec(spec) for key, spec in RESUME_SCHEMA.items()}
+
+
+def coerce(value, spec):
+    """Fix the common, unambiguous defects: nulls for strings, scalars for lists, numbers for strings."""
+    if spec == "string":
+        if value is None:
+            return ""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return value
+
+    if spec == "year":
+        return "" if value is None else value
+
+    if isinstance(spec, list):
+        if value is None:
+            return []
+        if isinstance(value, str) and spec[0] == "string":
+            return [part.strip() for part in value.split(",") if part.strip()]
+        if isinstance(value, dict) or (isinstance(value, str) and spec[0] != "string"):
+            value = [value]
+        if isinstance(value, list):
+            return [coerce(item, spec[0]) for item in value]
+        return value
+
+    if isinstance(value, dict):
+        coerced = dict(value)
+        for key, sub in spec.items():
+            name = field_name(key)
+            if name in coerced:
+                if not (key.endswith("?") and coerced[name] is None):
+                    coerced[name] = coerce(coerced[name], sub)
+            elif not key.endswith("?") and isinstance(sub, str):
+                coerced[name] = ""
+        return coerced
+    return value
+
+
+def default_for(spec):
+    return [] if isinstance(spec, list) else ""
+
+
+def validate_resume(doc):
+    """Coerce `doc` in place and return {section: [errors]} for the sections that are still invalid."""
+    invalid = {}
+    for key, spec in RESUME_SCHEMA.items():
+        name = field_name(key)
+        if name not in doc or doc[name] is None:
+            doc[name] = default_for(spec)
+        doc[name] = coerce(doc[name], spec)
+        errors = SECTION_VALIDATORS[name](doc[name], name)
+        if errors:
+            invalid[name] = errors
+    return invalid
+
+
+def repair_json(text):
+    """Fix common syntax defects in model output: prose around the object, Python literals,
+    raw newlines inside strings, trailing commas and unclosed strings/brackets from truncation."""
+    start = text.find("{")
+    if start == -1:
+        return text
+    text = text[start:]
+    end = top_level_end(text)
+    if end is not None:
+        # Drop whatever follows the object ("Let me know if..."); without a close it is truncated.
+        text = text[:end + 1]
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            elif ch == "\t":
+                ch = "\\t"
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if ch not in stack:
+                i += 1
+                continue
+            # Close anything left open inside this container before closing it.
+            while stack[-1] != ch:
+                strip_trailing_comma(out)
+                out.append(stack.pop())
+            stack.pop()
+            strip_trailing_comma(out)
+        else:
+            for literal, replacement in PYTHON_LITERALS.items():
+                if text.startswith(literal, i) and not (i and text[i - 1].isalnum()):
+                    out.append(replacement)
+                    i += len(literal)
+                    break
+            else:
+                out.append(ch)
+                i += 1
+            continue
+        out.append(ch)
+        i += 1
+
+    if in_string:
+        out.append('"')
+    for closer in reversed(stack):
+        strip_trailing_comma(out)
+        out.append(closer)
+    return "".join(out)
+
+
+def top_level_end(text):
+    """Index of the brace closing the object that opens `text`, or None if it never closes."""
+    depth = 0
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return i
+    return None
+
+
+def strip_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def split_sections(text):
+    """Split the top-level object into {key: raw value text} without parsing the values,
+    so one broken section does not take the others down with it."""
+    start = text.find("{")
+    if start == -1:
+        return {}
+    sections = {}
+    i = start + 1
+    n = len(text)
+    while i < n:
+        key_match = SECTION_KEY.match(text, i)
+        if not key_match:
+            break
+        key = key_match.group(1)
+        i = key_match.end()
+        value_start = i
+        depth = 0
+        in_string = False
+        escape = False
+        while i < n:
+            ch = text[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in "{[":
+                depth += 1
+            elif ch in "}]":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif ch == "," and depth == 0:
+                # A top-level comma only ends the value if the next thing is a quoted key.
+                if NEXT_KEY.match(text, i + 1):
+                    break
+            i += 1
+        sections[key] = text[value_start:i].strip()
+    return sections
+
+
+def parse_sections(text):
+    """Parse each top-level section independently; returns (parsed, {key: raw text of unparseable sections})."""
+    parsed, broken = {}, {}
+    for key, raw in split_sections(text).items():
+        for candidate in (raw, repair_json("{\"v\": " + raw + "}")):
+            try:
+                value = json.loads(candidate)
+                parsed[key] = value["v"] if candidate is not raw else value
+                break
+            except (ValueError, TypeError, KeyError):
+                continue
+        else:
+            broken[key] = raw
+    return parsed, broken
+
+
+def describe(spec):
+    """Render a spec in the same notation the main prompt uses."""
+    if isinstance(spec, list):
+        return [describe(spec[0])]
+    if isinstance(spec, dict):
+        return {field_name(key): describe(sub) + (" (optional)" if key.endswith("?") and isinstance(sub, str) else "")
+                for key, sub in spec.items()}
+    return "str" if spec == "string" else "int or str"
+
+
+def section_spec(section):
+    for key, spec in RESUME_SCHEMA.items():
+        if field_name(key) == section:
+            return spec
+    raise KeyError(section)
@@ -4,10 +4,32 @@ from pathlib import Path
 from dotenv import load_dotenv
 import httpx
 import asyncio
-from src.utils.progress import update_progress
+import hashlib
+from contextlib import asynccontextmanager
+from src.utils.progress import ProgressTracker
+from src.standardizer.rate_limiter import RateLimitScheduler
+from src.standardizer.prompt_compactor import compact_content, compact_links, format_links, count_tokens
+from src.standardizer.batch import BatchStandardizer
+from src.standardizer.stream_parser import IncrementalJSONValidator, SchemaDivergence
+from src.standardizer.schema import (
+    RESUME_SCHEMA, SECTION_VALIDATORS, coerce, describe, field_name, parse_sections,
+    repair_json, section_spec, validate_resume
+)
+from src.utils.disk_cache import DiskCache
 from datetime import datetime
 
+
+class RetryableResponse(Exception):
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+
 class ResumeStandardizer:
+    # Bump whenever the prompt template changes so cached responses are invalidated.
+    PROMPT_VERSION = "2"
+
     def __init__(self):
         load_dotenv()
         self.api_key = os.getenv("AZURE_OPENAI_API_KEY")
@@ -23,6 +45,66 @@ class ResumeStandardizer:
         self.RAW_LOG_DIR = Path("data/standardized_raw_responses")
         self.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         self.RAW_LOG_DIR.mkdir(parents=True, exist_ok=True)
+        self.MAX_CONCURRENCY = int(os.getenv("AZURE_OPENAI_MAX_CONCURRENCY", "16"))
+        self.REQUESTS_PER_MINUTE = int(os.getenv("AZURE_OPENAI_RPM", "900"))
+        self.TOKENS_PER_MINUTE = int(os.getenv("AZURE_OPENAI_TPM", "150000"))
+        self.MAX_RETRIES = int(os.getenv("AZURE_OPENAI_MAX_RETRIES", "8"))
+        # Streaming lets malformed generations be aborted early instead of paying for every token.
+        self.STREAMING = os.getenv("AZURE_OPENAI_STREAM", "false").lower() == "true"
+        self.MAX_STREAM_ABORTS = int(os.getenv("AZURE_OPENAI_MAX_STREAM_ABORTS", "2"))
+        self.TEMPERATURE = 0.2
+        # max_tokens is sized per request from the prompt; these bound it.
+        self.MIN_TOKENS = 1500
+        self.MAX_TOKENS = 6000
+        self.OUTPUT_TOKEN_RATIO = 1.5
+        self.response_cache = DiskCache(
+            os.getenv("RESPONSE_CACHE_PATH", "data/llm_cache/responses.sqlite"),
+            max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(1024 ** 3)))
+        )
+        # Write standardized resumes straight into Mongo; the JSON files then become optional debug output.
+        self.MONGO_SINK = os.getenv("STANDARDIZER_MONGO_SINK", "false").lower() == "true"
+        self.JSON_OUTPUT = os.getenv("STANDARDIZER_JSON_OUTPUT", "true").lower() == "true"
+        self.client = None
+        self.scheduler = None
+        self.sink = None
+
+    def create_client(self):
+        return httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(60, connect=10),
+            limits=httpx.Limits(
+                max_connections=self.MAX_CONCURRENCY,
+                max_keepalive_connections=self.MAX_CONCURRENCY,
+                keepalive_expiry=30
+            )
+        )
+
+    @asynccontextmanager
+    async def session(self):
+        """Share one keep-alive HTTP/2 client across every request made inside the block."""
+        if self.client is not None:
+            yield self.client
+            return
+        self.client = self.create_client()
+        self.scheduler = RateLimitScheduler(
+            self.REQUESTS_PER_MINUTE,
+            self.TOKENS_PER_MINUTE,
+            self.MAX_CONCURRENCY,
+            max_retries=self.MAX_RETRIES
+        )
+        try:
+            if self.MONGO_SINK:
+                from src.db_manager.mongo_sink import AsyncMongoSink
+
+                async with AsyncMongoSink() as self.sink:
+                    yield self.client
+            else:
+                yield self.client
+        finally:
+            await self.client.aclose()
+            self.client = None
+            self.scheduler = None
+            self.sink = None
 
     def make_standardizer_prompt(self, content: str, links: list) -> str:
         return f"""<full_prompt_contents>""".replace("<full_prompt_contents>", self._prompt_template(content, links))
@@ -41,13 +123,14 @@ The content has been parsed using *LlamaParse*, so please note:
 --- EXTRACTED HYPERLINKS ---
 The hyperlinks have been extracted using *Fitz*. Please note:
 - The links are mostly accurate, but the anchor texts may be confusing and should not be blindly trusted.
+- They are listed one per line as `anchor text -> URL`.
 - Only use a link where the surrounding content makes the intent clear (e.g., GitHub → social, certificate → certifications).
 
 --- RESUME CONTENT ---
 \"\"\"{content}\"\"\"
 
 --- HYPERLINKS (Extracted from PDF) ---
-{json.dumps(links, indent=2)}
+{format_links(links)}
 
 --- STANDARDIZED STRUCTURE ---
 Convert the resume to a JSON object strictly following this structure:
@@ -117,109 +200,362 @@ The quality of your standardization directly impacts downstream processing. Ensu
             return cleaned[3:-3].strip()
         return cleaned
 
-    async def call_azure_llm(self, prompt: str) -> str:
-        headers = {
-            "Content-Type": "application/json",
-            "api-key": self.api_key,
-        }
-        body = {
+    def budget_max_tokens(self, content: str) -> int:
+        """The JSON restates the resume, so size the completion budget from the content length."""
+        estimate = int(count_tokens(content) * self.OUTPUT_TOKEN_RATIO) + 600
+        return max(self.MIN_TOKENS, min(self.MAX_TOKENS, estimate))
+
+    def build_request_body(self, prompt: str, max_tokens: int = None) -> dict:
+        return {
             "messages": [
                 {"role": "system", "content": "You are a helpful assistant that formats resumes into structured JSON."},
                 {"role": "user", "content": prompt}
             ],
-            "temperature": 0.2,
-            "max_tokens": 6000,
+            "temperature": self.TEMPERATURE,
+            "max_tokens": max_tokens or self.MAX_TOKENS,
         }
-        url = f"{self.endpoint}/openai/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
-        async with httpx.AsyncClient(timeout=60) as client:
-            response = await client.post(url, headers=headers, json=body)
-            response.raise_for_status()
-            return response.json()["choices"][0]["message"]["content"]
 
-    async def standardize_resume(self, file_path: Path):
-        output_path = self.OUTPUT_DIR / file_path.name
-        raw_log_path = self.RAW_LOG_DIR / file_path.name.replace(".json", ".md")
+    def request_headers(self) -> dict:
+        return {
+            "Content-Type": "application/json",
+            "api-key": self.api_key,
+        }
 
-        if output_path.exists():
+    def chat_completions_url(self) -> str:
+        return f"{self.endpoint}/openai/deployments/{self.deployment}/chat/completions?api-version={self.api_version}"
+
+    def check_response(self, response):
+        self.scheduler.observe(response.headers)
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableResponse(response)
+        response.raise_for_status()
+
+    async def send_with_retries(self, estimated_tokens: int, send):
+        """Run `send(client)` inside a scheduler slot, retrying throttling, 5xx and transport errors."""
+        async with self.session() as client:
+            scheduler = self.scheduler
+            for attempt in range(scheduler.max_retries + 1):
+                async with scheduler.slot(estimated_tokens):
+                    try:
+                        result = await send(client)
+                    except httpx.TransportError as e:
+                        reason, delay = str(e) or type(e).__name__, scheduler.backoff(attempt)
+                    except RetryableResponse as e:
+                        delay = scheduler.retry_delay(e.headers, attempt)
+                        if e.status_code == 429:
+                            reason = "rate limited"
+                            scheduler.on_throttle(delay)
+                        else:
+                            reason = f"HTTP {e.status_code}"
+                    else:
+                        scheduler.on_success()
+                        return result
+
+                if attempt < scheduler.max_retries:
+                    print(f"⏳ Azure OpenAI {reason}, retrying in {delay:.1f}s (attempt {attempt + 1}/{scheduler.max_retries})")
+                    await asyncio.sleep(delay)
+
+            raise RuntimeError(f"Azure OpenAI request failed after {scheduler.max_retries} retries: {reason}")
+
+    def truncated(self, finish_reason: str, body: dict) -> bool:
+        """Whether an answer was cut off by a budgeted max_tokens that could still be raised."""
+        if finish_reason == "length" and body["max_tokens"] < self.MAX_TOKENS:
+            print(f"✂️ Completion hit max_tokens={body['max_tokens']}, retrying with {self.MAX_TOKENS}")
+            return True
+        return False
+
+    async def call_azure_llm(self, prompt: str, max_tokens: int = None) -> str:
+        body = self.build_request_body(prompt, max_tokens)
+        estimated_tokens = count_tokens(prompt) + body["max_tokens"]
+
+        async def send(client):
+            response = await client.post(self.chat_completions_url(), headers=self.request_headers(), json=body)
+            self.check_response(response)
+            choice = response.json()["choices"][0]
+            return choice["message"]["content"], choice.get("finish_reason")
+
+        content, finish_reason = await self.send_with_retries(estimated_tokens, send)
+        if self.truncated(finish_reason, body):
+            return await self.call_azure_llm(prompt, self.MAX_TOKENS)
+        return content
+
+    async def call_azure_llm_stream(self, prompt: str, max_tokens: int = None, raw_log_path: Path = None) -> str:
+        """Stream the completion through an incremental JSON validator, aborting as soon as it diverges."""
+        body = self.build_request_body(prompt, max_tokens)
+        body["stream"] = True
+        estimated_tokens = count_tokens(prompt) + body["max_tokens"]
+
+        async def send(client):
+            validator = IncrementalJSONValidator()
+            parts = []
+            finish_reason = None
+            log = open(raw_log_path, "w", encoding="utf-8") if raw_log_path else None
+            try:
+                async with client.stream("POST", self.chat_completions_url(), headers=self.request_headers(), json=body) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                    self.check_response(response)
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        choices = json.loads(data).get("choices") or []
+                        if choices and choices[0].get("finish_reason"):
+                            finish_reason = choices[0]["finish_reason"]
+                        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if not delta:
+                            continue
+                        parts.append(delta)
+                        if log:
+                            log.write(delta)
+                            log.flush()
+                        # Raising here leaves the stream context, which closes the connection and stops generation.
+                        validator.feed(delta)
+                if finish_reason != "length" and not validator.finish():
+                    # Keep what arrived: resolve_response repairs it and re-asks only the missing sections.
+                    print("⚠️ Stream ended before the JSON object was complete, repairing the partial answer")
+                return "".join(parts), finish_reason
+            finally:
+                if log:
+                    log.close()
+
+        for abort in range(self.MAX_STREAM_ABORTS + 1):
+            try:
+                content, finish_reason = await self.send_with_retries(estimated_tokens, send)
+            except SchemaDivergence as e:
+                if abort == self.MAX_STREAM_ABORTS:
+                    raise
+                print(f"✂️ Aborted diverging generation ({e}), retrying ({abort + 1}/{self.MAX_STREAM_ABORTS})")
+                continue
+            if self.truncated(finish_reason, body):
+                return await self.call_azure_llm_stream(prompt, self.MAX_TOKENS, raw_log_path)
+            # Cut off at the full cap: resolve_response re-asks whatever sections are missing.
+            return content
+
+    def response_cache_key(self, content: str, links: list, max_tokens: int) -> str:
+        fingerprint = json.dumps(
+            [self.PROMPT_VERSION, content, links, self.deployment, self.TEMPERATURE, max_tokens],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()
+
+    def report_cache_stats(self):
+        stats = self.response_cache.stats()
+        print(f"📊 Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries")
+        return stats
+
+    def prepare_request(self, file_path: Path):
+        """Build the prompt for one parsed resume, or return None if there is nothing to send."""
+        output_path = self.OUTPUT_DIR / file_path.name
+        if self.JSON_OUTPUT and output_path.exists():
             print(f"⏩ Skipping {file_path.name} (already standardized)")
-            return
+            return None
+        return self.load_request(file_path)
 
+    def load_request(self, file_path: Path):
         with open(file_path, encoding="utf-8") as f:
             raw = json.load(f)
 
-        content = raw.get("content", "")
-        links = raw.get("links", [])
+        links = compact_links(raw.get("links", []))
+        content = compact_content(raw.get("content", ""), links)
 
         if not content.strip():
             print(f"⚠️ Empty content in {file_path.name}, skipping.")
-            return
+            return None
+
+        max_tokens = self.budget_max_tokens(content)
+        return {
+            "content": content,
+            "prompt": self.make_standardizer_prompt(content, links),
+            "max_tokens": max_tokens,
+            "cache_key": self.response_cache_key(content, links, max_tokens),
+        }
 
-        prompt = self.make_standardizer_prompt(content, links)
+    def parse_response(self, raw_response: str):
+        """Parse and validate a model answer.
 
+        Returns the coerced document and {section: malformed fragment or None} for the
+        sections that still need to be re-asked.
+        """
+        cleaned = self.clean_llm_response(raw_response)
+        broken = {}
         try:
-            print(f"🔍 Standardizing: {file_path.name}")
-            raw_response = await self.call_azure_llm(prompt)
+            doc = json.loads(cleaned)
+        except ValueError:
+            try:
+                doc = json.loads(repair_json(cleaned))
+            except ValueError:
+                doc, broken = parse_sections(cleaned)
+                if not doc and not broken:
+                    raise
+                # Sections cut off by truncation never made it into the output at all.
+                for key in RESUME_SCHEMA:
+                    if field_name(key) not in doc:
+                        broken.setdefault(field_name(key), None)
+
+        if not isinstance(doc, dict):
+            raise ValueError("model output is not a JSON object")
+
+        errors = validate_resume(doc)
+        invalid = {section: json.dumps(doc[section], ensure_ascii=False) for section in errors}
+        invalid.update(broken)
+        return doc, invalid
+
+    def make_section_prompt(self, section: str, fragment: str, content: str) -> str:
+        structure = json.dumps({section: describe(section_spec(section))}, indent=2)
+        if fragment:
+            source = f"""The "{section}" section of a standardized resume came back malformed. Fix it without adding, removing or rewording any information:
+\"\"\"{fragment}\"\"\""""
+        else:
+            source = f"""Extract only the "{section}" section from this resume content:
+\"\"\"{content}\"\"\""""
+        return f"""{source}
+
+Return a JSON object with exactly this structure:
+{structure}
+
+Output only the JSON object. Do not wrap in markdown or include any extra commentary.
+"""
+
+    async def repair_section(self, section: str, fragment: str, content: str):
+        prompt = self.make_section_prompt(section, fragment, content)
+        max_tokens = min(self.MAX_TOKENS, int(count_tokens(fragment or content) * self.OUTPUT_TOKEN_RATIO) + 200)
+        raw_response = await self.call_azure_llm(prompt, max_tokens)
+
+        answer = json.loads(repair_json(self.clean_llm_response(raw_response)))
+        value = answer.get(section) if isinstance(answer, dict) and section in answer else answer
+        value = coerce(value, section_spec(section))
+        errors = SECTION_VALIDATORS[section](value, section)
+        if errors:
+            raise ValueError(f"section '{section}' is still invalid: {'; '.join(errors[:3])}")
+        return value
+
+    async def resolve_response(self, file_path: Path, raw_response: str, request: dict = None) -> dict:
+        """Turn a model answer into a valid document, re-asking only the sections that are broken."""
+        doc, invalid = self.parse_response(raw_response)
+        if not invalid:
+            return doc
+
+        print(f"🩹 Re-asking {len(invalid)} section(s) for {file_path.name}: {', '.join(invalid)}")
+        content = ""
+        if any(not fragment for fragment in invalid.values()):
+            request = request or await asyncio.to_thread(self.load_request, file_path)
+            content = request["content"] if request else ""
+        repaired = await asyncio.gather(*(
+            self.repair_section(section, fragment, content) for section, fragment in invalid.items()
+        ))
+        doc.update(zip(invalid, repaired))
+        return doc
+
+    def save_response(self, file_path: Path, raw_response: str, parsed_json: dict, cache_key: str = None):
+        """Log the raw answer and write the validated document."""
+        output_path = self.OUTPUT_DIR / file_path.name
+        raw_log_path = self.RAW_LOG_DIR / file_path.name.replace(".json", ".md")
 
-            with open(raw_log_path, "w", encoding="utf-8") as f:
-                f.write(raw_response)
+        with open(raw_log_path, "w", encoding="utf-8") as f:
+            f.write(raw_response)
 
-            cleaned_json = self.clean_llm_response(raw_response)
-            parsed_json = json.loads(cleaned_json)
+        if cache_key:
+            # Cache the validated document, so repaired sections are not re-asked on the next run.
+            self.response_cache.set(cache_key, json.dumps(parsed_json, ensure_ascii=False))
 
+        if self.JSON_OUTPUT:
             with open(output_path, "w", encoding="utf-8") as f:
                 json.dump(parsed_json, f, indent=2, ensure_ascii=False)
-
             print(f"✅ Saved standardized resume: {output_path.name}")
+
+    async def publish(self, file_path: Path, parsed_json: dict):
+        """Hand the document to the Mongo sink, waiting if the sink is backed up."""
+        if self.sink is not None:
+            await self.sink.put(parsed_json, file_path.name)
+
+    async def standardize_resume(self, file_path: Path):
+        # Cache lookups and file writes are blocking SQLite and disk calls; keep them off the event loop.
+        request = await asyncio.to_thread(self.prepare_request, file_path)
+        if request is None:
+            return
+
+        try:
+            raw_response = await asyncio.to_thread(self.response_cache.get, request["cache_key"])
+            if raw_response is None:
+                print(f"🔍 Standardizing: {file_path.name}")
+                if self.STREAMING:
+                    raw_log_path = self.RAW_LOG_DIR / file_path.name.replace(".json", ".md")
+                    raw_response = await self.call_azure_llm_stream(request["prompt"], request["max_tokens"], raw_log_path)
+                else:
+                    raw_response = await self.call_azure_llm(request["prompt"], request["max_tokens"])
+                parsed_json = await self.resolve_response(file_path, raw_response, request)
+                await asyncio.to_thread(self.save_response, file_path, raw_response, parsed_json, request["cache_key"])
+            else:
+                print(f"♻️ Using cached response for {file_path.name}")
+                parsed_json = await self.resolve_response(file_path, raw_response, request)
+                await asyncio.to_thread(self.save_response, file_path, raw_response, parsed_json)
+            await self.publish(file_path, parsed_json)
         except Exception as e:
             print(f"❌ Failed to standardize {file_path.name}: {e}")
+            raise
+
+    async def standardize_all(self, files, on_start=None, on_finish=None):
+        """Standardize files concurrently, keeping at most MAX_CONCURRENCY requests in flight."""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+
+        async def process(file):
+            async with semaphore:
+                if on_start:
+                    on_start(file)
+                try:
+                    await self.standardize_resume(file)
+                    status, error = "done", None
+                except Exception as e:
+                    status, error = "error", str(e)
+                if on_finish:
+                    on_finish(file, status, error)
+
+        async with self.session():
+            await asyncio.gather(*(process(file) for file in files))
+
+    async def run_batch(self, transport=None):
+        """Standardize INPUT_DIR through the asynchronous Batch API, resuming any unfinished job."""
+        runner = BatchStandardizer(self, transport=transport)
+        async with self.session():
+            await runner.run()
+        self.report_cache_stats()
 
     async def run(self):
         files = list(self.INPUT_DIR.glob("*.json"))
         print(f"📂 Found {len(files)} resumes to standardize.\n")
-        for file in files:
-            await self.standardize_resume(file)
+        await self.standardize_all(files)
+        self.report_cache_stats()
 
     async def run_with_progress(self, task_id: str):
-      files = list(self.INPUT_DIR.glob("*.json"))
-      total = len(files)
-      completed = 0
-      started_at = datetime.utcnow().isoformat()
-      file_statuses = []
-
-      for i, file in enumerate(files):
-          status = { "name": file.name, "status": "processing" }
-
-          update_progress(task_id, {
-              "task_id": task_id,
-              "status": "in_progress",
-              "phase": "standardizing",
-              "total": total,
-              "completed": completed,
-              "current_file": file.name,
-              "files": file_statuses + [status],
-              "started_at": started_at,
-          })
-
-          try:
-              await self.standardize_resume(file)
-              status["status"] = "done"
-              completed += 1
-          except Exception as e:
-              status["status"] = "error"
-              status["error"] = str(e)
-
-          file_statuses.append(status)
-
-      update_progress(task_id, {
-          "task_id": task_id,
-          "status": "done",
-          "phase": "standardizing",
-          "total": total,
-          "completed": completed,
-          "files": file_statuses,
-          "finished_at": datetime.utcnow().isoformat()
-      })
+        files = list(self.INPUT_DIR.glob("*.json"))
+        progress = ProgressTracker(task_id)
+        progress.start(phase="standardizing", total=len(files), started_at=datetime.utcnow().isoformat())
+
+        def on_start(file):
+            progress.file_started(file.name)
+
+        def on_finish(file, result, error):
+            progress.file_finished(file.name, result, error=error, counted=not error)
+
+        await self.standardize_all(files, on_start=on_start, on_finish=on_finish)
+        cache_stats = self.report_cache_stats()
+
+        progress.finish(
+            "done",
+            cache={"hits": cache_stats["hits"], "misses": cache_stats["misses"]},
+            finished_at=datetime.utcnow().isoformat()
+        )
 
 if __name__ == "__main__":
-    asyncio.run(ResumeStandardizer().run())
- 
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", action="store_true", help="Submit resumes through the Batch API instead of chat completions")
+    args = parser.parse_args()
+
+    standardizer = ResumeStandardizer()
+    asyncio.run(standardizer.run_batch() if args.batch else standardizer.run())
\ No newline at end of file
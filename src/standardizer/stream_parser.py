@@ -0,0 +1,207 @@
+import json
+
+WHITESPACE = " \t\r\n"
+# Python literals are accepted too: repair_json rewrites them before parsing.
+LITERALS = ("true", "false", "null", "True", "False", "None")
+NUMBER_CHARS = set("0123456789+-.eE")
+ESCAPES = set('"\\/bfnrtu')
+# Prose the model may write before the object ("Here is the JSON:"); repair_json strips it later.
+MAX_PREAMBLE = 2000
+
+
+class SchemaDivergence(Exception):
+    """The streamed output can no longer become a valid standardized resume."""
+
+
+class IncrementalJSONValidator:
+    """Character-level JSON pushdown validator fed with streamed completion deltas.
+
+    It only aborts on defects resolve_response cannot recover from. A short preamble before the
+    first '{', text after the object, Python literals, raw newlines in strings and trailing commas
+    are tolerated, since repair_json fixes them; unknown keys and wrongly shaped sections are left
+    to schema.coerce and the per-section re-asks.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.state = "start"
+        self.expect = "value"
+        self.buffer = []
+        self.escape = False
+        self.unicode_left = 0
+        self.position = 0
+
+    def fail(self, reason):
+        raise SchemaDivergence(f"{reason} at character {self.position}")
+
+    def feed(self, chunk):
+        for ch in chunk:
+            self.position += 1
+            self.step(ch)
+
+    def finish(self):
+        """Return whether the stream held a complete object; a truncated one is left to the repair path."""
+        return self.state == "done"
+
+    def skip_preamble(self, ch):
+        if self.position > MAX_PREAMBLE:
+            self.fail("no JSON object in the opening text")
+        if ch == "{":
+            self.open_container("object")
+
+    def step(self, ch):
+        state = self.state
+
+        if state == "done":
+            # The object is complete; whatever follows is dropped by clean-up and repair_json.
+            return
+
+        if state == "start":
+            if ch in WHITESPACE:
+                return
+            if ch == "`":
+                self.state = "fence_open"
+                self.buffer = [ch]
+                return
+            self.state = "preamble"
+            self.skip_preamble(ch)
+            return
+
+        if state == "preamble":
+            self.skip_preamble(ch)
+            return
+
+        if state == "fence_open":
+            if ch == "\n":
+                header = "".join(self.buffer).strip()
+                if header not in ("```", "```json"):
+                    self.fail(f"unexpected fence {header!r}")
+                self.state = "start_after_fence"
+                return
+            self.buffer.append(ch)
+            if len(self.buffer) > 10:
+                self.fail("unterminated code fence header")
+            return
+
+        if state == "start_after_fence":
+            if ch in WHITESPACE:
+                return
+            self.state = "preamble"
+            self.skip_preamble(ch)
+            return
+
+        if state == "string":
+            self.step_string(ch)
+            return
+
+        if state in ("number", "literal"):
+            if state == "number" and ch in NUMBER_CHARS:
+                self.buffer.append(ch)
+                return
+            if state == "literal" and ch.isalpha():
+                self.buffer.append(ch)
+                word = "".join(self.buffer)
+                if not any(literal.startswith(word) for literal in LITERALS):
+                    self.fail(f"invalid literal {word!r}")
+                return
+            self.end_scalar()
+            self.step(ch)
+            return
+
+        # Between tokens inside a container.
+        if ch in WHITESPACE:
+            return
+        expect = self.expect
+        container = self.stack[-1]
+
+        if expect == "key_or_end":
+            if ch == '"':
+                self.begin_string(is_key=True)
+            elif ch == "}":
+                self.close_container()
+            else:
+                self.fail(f"expected a key but got {ch!r}")
+        elif expect == "colon":
+            if ch != ":":
+                self.fail(f"expected ':' but got {ch!r}")
+            self.expect = "value"
+        elif expect == "comma_or_end":
+            if ch == ",":
+                # A closing bracket may still follow: repair_json drops trailing commas.
+                self.expect = "key_or_end" if container == "object" else "value_or_end"
+            elif ch == "}" and container == "object":
+                self.close_container()
+            elif ch == "]" and container == "array":
+                self.close_container()
+            else:
+                self.fail(f"expected ',' or a closing bracket but got {ch!r}")
+        elif expect in ("value", "value_or_end"):
+            if ch == "]" and expect == "value_or_end":
+                self.close_container()
+                return
+            self.begin_value(ch)
+
+    def begin_value(self, ch):
+        if ch == "{" or ch == "[":
+            self.open_container("object" if ch == "{" else "array")
+        elif ch == '"':
+            self.begin_string(is_key=False)
+        elif ch == "-" or ch.isdigit():
+            self.state = "number"
+            self.buffer = [ch]
+        elif ch in "tfnTFN":
+            self.state = "literal"
+            self.buffer = [ch]
+        else:
+            self.fail(f"unexpected {ch!r} where a value should start")
+
+    def open_container(self, kind):
+        self.stack.append(kind)
+        self.state = "container"
+        self.expect = "key_or_end" if kind == "object" else "value_or_end"
+
+    def close_container(self):
+        self.stack.pop()
+        if not self.stack:
+            self.state = "done"
+            return
+        self.state = "container"
+        self.expect = "comma_or_end"
+
+    def begin_string(self, is_key):
+        self.state = "string"
+        self.string_is_key = is_key
+        self.escape = False
+        self.unicode_left = 0
+
+    def step_string(self, ch):
+        if self.unicode_left:
+            if ch not in "0123456789abcdefABCDEF":
+                self.fail("invalid \\u escape")
+            self.unicode_left -= 1
+            return
+        if self.escape:
+            if ch not in ESCAPES:
+                self.fail(f"invalid escape \\{ch}")
+            self.escape = False
+            if ch == "u":
+                self.unicode_left = 4
+            return
+        if ch == "\\":
+            self.escape = True
+            return
+        if ch == '"':
+            self.state = "container"
+            self.expect = "colon" if self.string_is_key else "comma_or_end"
+
+    def end_scalar(self):
+        word = "".join(self.buffer)
+        if self.state == "number":
+            try:
+                json.loads(word)
+            except ValueError:
+                self.fail(f"invalid number {word!r}")
+        elif word not in LITERALS:
+            self.fail(f"invalid literal {word!r}")
+        self.state = "container"
+        self.expect = "comma_or_end"
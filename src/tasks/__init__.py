@@ -1,2 +1,4 @@
-from .parser_tasks import parse_resumes_task
-from .standardizer_tasks import standardize_resumes_task
+from .parser_tasks import parse_resumes_task, parse_chunk_task
+from .standardizer_tasks import standardize_resumes_task, standardize_chunk_task
+from .tier_tasks import assign_tiers_task, tier_chunk_task
+from .fanout import finalize_job_task
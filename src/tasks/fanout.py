@@ -0,0 +1,85 @@
+import os
+from collections import Counter
+from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from src.celery_app import celery_app
+from src.utils.progress import ProgressTracker
+
+CHUNK_MAX_RETRIES = int(os.getenv("CELERY_CHUNK_MAX_RETRIES", "3"))
+CHUNK_RETRY_DELAY = float(os.getenv("CELERY_CHUNK_RETRY_DELAY", "30"))
+# How many chunk tasks can run at once across every worker (the sum of their --concurrency).
+# Provider quotas such as AZURE_OPENAI_RPM are account-wide, so each chunk gets this share of them.
+WORKER_SLOTS = max(1, int(os.getenv("CELERY_WORKER_SLOTS", "1")))
+
+
+def chunk_files(files, size, key=None):
+    """Split files into chunks of about `size`, never separating files that share `key`."""
+    files = sorted(files, key=lambda f: (key(f) if key else "", f.name))
+    chunks, current = [], []
+    for _, group in groupby(files, key=key or (lambda f: f.name)):
+        group = list(group)
+        if current and len(current) + len(group) > size:
+            chunks.append(current)
+            current = []
+        current.extend(group)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def register_job(job_id, phase, files, chunks):
+    """Start the parent job's progress and list every file as queued, in dispatch order."""
+    progress = ProgressTracker(job_id)
+    progress.start(phase=phase, total=len(files), chunks=len(chunks), started_at=datetime.utcnow().isoformat())
+    if files:
+        progress.write(files={f.name: {"name": f.name, "status": "queued"} for chunk in chunks for f in chunk})
+    return progress
+
+
+def budget_share(budget):
+    """One chunk task's part of an account-wide budget, so concurrent chunks together stay within it."""
+    return max(1, budget // WORKER_SLOTS)
+
+
+def final_attempt(task):
+    return task.request.retries >= task.max_retries
+
+
+def settle_chunk(task, job_id, statuses, done=None, key=None):
+    """Return the chunk's {file name: status}, or retry the task with the files that failed.
+
+    With `key`, every file sharing a failed file's key is retried with it, so decisions made across
+    the group (such as output names) are made again in one place. Those files keep their status in
+    `done`; the chunk task uses that to avoid counting them twice.
+    """
+    results = dict(done or {})
+    failed = []
+    for path, status in statuses.items():
+        results[Path(path).name] = status
+        if status == "error" and not final_attempt(task):
+            failed.append(path)
+    if failed:
+        failed_keys = {key(Path(path)) for path in failed} if key else set()
+        retried = [path for path in statuses
+                   if path in failed or (key and key(Path(path)) in failed_keys)]
+        for path in failed:
+            del results[Path(path).name]
+        raise task.retry(
+            args=(job_id, retried),
+            kwargs={"done": results},
+            countdown=CHUNK_RETRY_DELAY * 2 ** task.request.retries
+        )
+    return results
+
+
+@celery_app.task
+def finalize_job_task(chunk_results, job_id):
+    """Chord callback: merge per-chunk results into the parent job's outcome."""
+    results = {}
+    for chunk in chunk_results:
+        results.update(chunk)
+    counts = dict(Counter(results.values()))
+    failed = sorted(name for name, status in results.items() if status == "error")
+    ProgressTracker(job_id).finish("done", counts=counts, finished_at=datetime.utcnow().isoformat())
+    return {"status": "success", "counts": counts, "failed": failed}
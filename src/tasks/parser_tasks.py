@@ -1,24 +1,71 @@
+import os
+import asyncio
+from pathlib import Path
+from celery import chord
 from src.celery_app import celery_app
 from src.llama_parser.llama_resume_parser import ResumeParser
+from src.tasks.fanout import (
+    CHUNK_MAX_RETRIES, CHUNK_RETRY_DELAY, budget_share, chunk_files, final_attempt, finalize_job_task, register_job,
+    settle_chunk
+)
+
+PARSE_CHUNK_SIZE = int(os.getenv("CELERY_PARSE_CHUNK_SIZE", "8"))
 
 @celery_app.task(bind=True)
 def parse_resumes_task(self):
+    """Fan the resume directory out into parse_chunk_task subtasks; this task's id is the job id."""
     from src.utils.progress import update_progress
     from datetime import datetime
 
-    task_id = self.request.id
+    job_id = self.request.id
     try:
-        update_progress(task_id, {
-            "task_id": task_id,
-            "status": "starting",
-            "started_at": datetime.utcnow().isoformat()
-        })
-        ResumeParser().run_with_progress(task_id)
-        return {"status": "success"}
+        files = ResumeParser().get_resume_files()
+        # Same-stem files stay together so output name collisions are still resolved in one place.
+        chunks = chunk_files(files, PARSE_CHUNK_SIZE, key=lambda f: f.stem)
+        progress = register_job(job_id, "parsing", files, chunks)
+        if not chunks:
+            progress.finish("done", finished_at=datetime.utcnow().isoformat())
+            return {"status": "success"}
+
+        callback = chord(
+            parse_chunk_task.s(job_id, [str(f) for f in chunk]) for chunk in chunks
+        )(finalize_job_task.s(job_id))
+        return {"status": "dispatched", "job_id": job_id, "callback_id": callback.id, "chunks": len(chunks)}
     except Exception as e:
-        update_progress(task_id, {
-            "task_id": task_id,
+        update_progress(job_id, {
+            "task_id": job_id,
             "status": "error",
             "error": str(e)
         })
         return {"status": "error", "message": str(e)}
+
+@celery_app.task(bind=True, acks_late=True, max_retries=CHUNK_MAX_RETRIES)
+def parse_chunk_task(self, job_id, paths, done=None):
+    from src.utils.progress import ProgressTracker, update_progress
+
+    resumes = [Path(p) for p in paths]
+    progress = ProgressTracker(job_id, registered=[r.name for r in resumes])
+    last_try = final_attempt(self)
+
+    def on_start(resume):
+        progress.file_started(resume.name)
+
+    def on_finish(resume, status):
+        if status == "error" and not last_try:
+            progress.file_finished(resume.name, "retrying", counted=False)
+        else:
+            # Files retried only because a same-stem sibling failed were already counted.
+            progress.file_finished(resume.name, status,
+                                   counted=status in ("done", "cached") and resume.name not in (done or {}))
+
+    try:
+        parser = ResumeParser()
+        parser.MAX_IN_FLIGHT = budget_share(parser.MAX_IN_FLIGHT)
+        statuses = asyncio.run(parser.process_resumes(resumes, on_start=on_start, on_finish=on_finish))
+    except Exception as e:
+        if last_try:
+            update_progress(job_id, {"status": "error", "error": str(e)})
+            raise
+        raise self.retry(exc=e, countdown=CHUNK_RETRY_DELAY * 2 ** self.request.retries)
+
+    return settle_chunk(self, job_id, dict(zip(paths, statuses)), done, key=lambda f: f.stem)
@@ -1,28 +1,73 @@
+import os
+from pathlib import Path
+from celery import chord
 from src.celery_app import celery_app
 from src.standardizer.standardizer import ResumeStandardizer
+from src.tasks.fanout import (
+    CHUNK_MAX_RETRIES, CHUNK_RETRY_DELAY, budget_share, chunk_files, final_attempt, finalize_job_task, register_job,
+    settle_chunk
+)
 import asyncio
 
+STANDARDIZE_CHUNK_SIZE = int(os.getenv("CELERY_STANDARDIZE_CHUNK_SIZE", "16"))
+
 @celery_app.task(bind=True)
 def standardize_resumes_task(self):
+    """Fan the parsed resumes out into standardize_chunk_task subtasks; this task's id is the job id."""
     from src.utils.progress import update_progress
     from datetime import datetime
 
-    task_id = self.request.id
-    update_progress(task_id, {
-        "task_id": task_id,
-        "status": "starting",
-        "phase": "standardizing",
-        "started_at": datetime.utcnow().isoformat()
-    })
-
+    job_id = self.request.id
     try:
-        asyncio.run(ResumeStandardizer().run_with_progress(task_id))
-        return {"status": "success", "message": "Standardization complete"}
+        files = list(ResumeStandardizer().INPUT_DIR.glob("*.json"))
+        chunks = chunk_files(files, STANDARDIZE_CHUNK_SIZE)
+        progress = register_job(job_id, "standardizing", files, chunks)
+        if not chunks:
+            progress.finish("done", finished_at=datetime.utcnow().isoformat())
+            return {"status": "success", "message": "Standardization complete"}
+
+        callback = chord(
+            standardize_chunk_task.s(job_id, [str(f) for f in chunk]) for chunk in chunks
+        )(finalize_job_task.s(job_id))
+        return {"status": "dispatched", "job_id": job_id, "callback_id": callback.id, "chunks": len(chunks)}
     except Exception as e:
-        update_progress(task_id, {
-            "task_id": task_id,
+        update_progress(job_id, {
+            "task_id": job_id,
             "status": "error",
             "phase": "standardizing",
             "error": str(e)
         })
         return {"status": "error", "message": str(e)}
+
+@celery_app.task(bind=True, acks_late=True, max_retries=CHUNK_MAX_RETRIES)
+def standardize_chunk_task(self, job_id, paths, done=None):
+    from src.utils.progress import ProgressTracker, update_progress
+
+    files = [Path(p) for p in paths]
+    progress = ProgressTracker(job_id, registered=[f.name for f in files])
+    last_try = final_attempt(self)
+    statuses = {}
+
+    def on_start(file):
+        progress.file_started(file.name)
+
+    def on_finish(file, status, error):
+        statuses[str(file)] = status
+        if error and not last_try:
+            progress.file_finished(file.name, "retrying", error=error, counted=False)
+        else:
+            progress.file_finished(file.name, status, error=error, counted=not error)
+
+    try:
+        standardizer = ResumeStandardizer()
+        standardizer.REQUESTS_PER_MINUTE = budget_share(standardizer.REQUESTS_PER_MINUTE)
+        standardizer.TOKENS_PER_MINUTE = budget_share(standardizer.TOKENS_PER_MINUTE)
+        standardizer.MAX_CONCURRENCY = budget_share(standardizer.MAX_CONCURRENCY)
+        asyncio.run(standardizer.standardize_all(files, on_start=on_start, on_finish=on_finish))
+    except Exception as e:
+        if last_try:
+            update_progress(job_id, {"status": "error", "phase": "standardizing", "error": str(e)})
+            raise
+        raise self.retry(exc=e, countdown=CHUNK_RETRY_DELAY * 2 ** self.request.retries)
+
+    return settle_chunk(self, job_id, statuses, done)
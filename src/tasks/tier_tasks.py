@@ -0,0 +1,69 @@
+import os
+from pathlib import Path
+from celery import chord
+from src.celery_app import celery_app
+from src.tier_assignment.tier_runner import TierRunner
+from src.tasks.fanout import (
+    CHUNK_MAX_RETRIES, CHUNK_RETRY_DELAY, chunk_files, final_attempt, finalize_job_task, register_job, settle_chunk
+)
+
+TIER_CHUNK_SIZE = int(os.getenv("CELERY_TIER_CHUNK_SIZE", "256"))
+
+@celery_app.task(bind=True)
+def assign_tiers_task(self):
+    """Fan the standardized resumes out into tier_chunk_task subtasks; this task's id is the job id."""
+    from src.utils.progress import update_progress
+    from datetime import datetime
+
+    job_id = self.request.id
+    try:
+        runner = TierRunner()
+        files = runner.get_json_files()
+        chunks = chunk_files(files, TIER_CHUNK_SIZE)
+        progress = register_job(job_id, "tiering", files, chunks)
+        if not chunks:
+            progress.finish("done", finished_at=datetime.utcnow().isoformat())
+            return {"status": "success", "message": "Tier assignment complete"}
+
+        # Build the embedding and ANN caches once here, so chunk workers only memory-map them.
+        runner.warm_cache()
+        callback = chord(
+            tier_chunk_task.s(job_id, [str(f) for f in chunk]) for chunk in chunks
+        )(finalize_job_task.s(job_id))
+        return {"status": "dispatched", "job_id": job_id, "callback_id": callback.id, "chunks": len(chunks)}
+    except Exception as e:
+        update_progress(job_id, {
+            "task_id": job_id,
+            "status": "error",
+            "phase": "tiering",
+            "error": str(e)
+        })
+        return {"status": "error", "message": str(e)}
+
+@celery_app.task(bind=True, acks_late=True, max_retries=CHUNK_MAX_RETRIES)
+def tier_chunk_task(self, job_id, paths, done=None):
+    from src.utils.progress import ProgressTracker, update_progress
+
+    files = [Path(p) for p in paths]
+    by_name = {f.name: str(f) for f in files}
+    progress = ProgressTracker(job_id, registered=list(by_name))
+    last_try = final_attempt(self)
+    statuses = {}
+
+    def on_result(name, status, error):
+        statuses[by_name[name]] = status
+        if error and not last_try:
+            progress.file_finished(name, "retrying", error=error, counted=False)
+        else:
+            progress.file_finished(name, status, error=error, counted=not error)
+
+    try:
+        lookups = TierRunner().process_resumes(files, on_result=on_result)
+        progress.write(increments={f"lookups_{stage}": count for stage, count in lookups.items() if count})
+    except Exception as e:
+        if last_try:
+            update_progress(job_id, {"status": "error", "phase": "tiering", "error": str(e)})
+            raise
+        raise self.retry(exc=e, countdown=CHUNK_RETRY_DELAY * 2 ** self.request.retries)
+
+    return settle_chunk(self, job_id, statuses, done)
@@ -1,8 +1,130 @@
 import os
 import json
 import csv
+import re
+import hashlib
+import unicodedata
+from collections import Counter, defaultdict
 import numpy as np
-from sentence_transformers import SentenceTransformer, util
+from src.utils.disk_cache import DiskCache
+from src.tier_assignment.ann_index import IVFIndex, recall
+from src.tier_assignment.encoders import create_encoder
+
+
+class InstitutionResolver:
+    """Resolves institution strings through progressively more expensive stages.
+
+    1. exact: normalized name lookup
+    2. fuzzy: character-trigram Dice similarity, with the final word matching exactly
+    3. memo: persisted results of earlier embedding lookups, including "No Match"
+    4. embedding: sentence-embedding search, only for whatever is left
+    """
+
+    STAGES = ("skipped", "exact", "fuzzy", "memo", "embedding")
+
+    def __init__(self, assigner, fuzzy_threshold=0.9, memo_path=None):
+        self.assigner = assigner
+        self.fuzzy_threshold = fuzzy_threshold
+        self.stats = dict.fromkeys(self.STAGES, 0)
+
+        self.exact_index = {}
+        self.college_trigrams = []
+        self.college_last_words = []
+        self.postings = defaultdict(list)
+        for idx, name in enumerate(assigner.college_names):
+            normalized = self.normalize(name)
+            self.exact_index.setdefault(normalized, idx)
+            self.exact_index.setdefault(self.normalize(assigner.expand_abbreviations(name)), idx)
+            grams = self.trigrams(normalized)
+            self.college_trigrams.append(grams)
+            self.college_last_words.append(normalized.rsplit(' ', 1)[-1])
+            for gram in grams:
+                self.postings[gram].append(idx)
+
+        self.memo = DiskCache(memo_path or os.path.join(assigner.cache_dir, "resolver_memo.sqlite"))
+
+    @staticmethod
+    def normalize(name):
+        name = unicodedata.normalize('NFKD', name)
+        name = ''.join(ch for ch in name if not unicodedata.combining(ch)).lower().replace('&', ' and ')
+        return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
+
+    @staticmethod
+    def trigrams(text):
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def fuzzy_match(self, normalized):
+        grams = self.trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        # The final word is usually the campus ("IIIT Kota" vs "IIIT Kottayam"); those must not merge.
+        last_word = normalized.rsplit(' ', 1)[-1]
+        best_idx, best_score = None, 0.0
+        for idx, count in shared.items():
+            if self.college_last_words[idx] != last_word:
+                continue
+            score = 2 * count / (len(grams) + len(self.college_trigrams[idx]))
+            if score > best_score:
+                best_idx, best_score = idx, score
+        return best_idx if best_score >= self.fuzzy_threshold else None
+
+    def resolve_many(self, institutions, threshold=0.8):
+        assigner = self.assigner
+        # "n:" marks entries embedded from the normalized query; older raw-query entries are ignored.
+        memo_prefix = f"{assigner.cache_key}:{threshold}:n:"
+        results = {}
+        stage_of = {}
+        pending = defaultdict(list)
+        occurrences = Counter(institution for institution in institutions if institution)
+
+        for institution in occurrences:
+            query = assigner.prepare_query(institution)
+            if query is None:
+                results[institution], stage_of[institution] = (None, None), "skipped"
+                continue
+
+            normalized = self.normalize(query)
+            idx = self.exact_index.get(normalized)
+            stage = "exact"
+            if idx is None:
+                idx = self.fuzzy_match(normalized)
+                stage = "fuzzy"
+            if idx is not None:
+                name = assigner.college_names[idx]
+                results[institution], stage_of[institution] = (name, assigner.college_tiers[name]), stage
+                continue
+
+            memoized = self.memo.get(memo_prefix + normalized)
+            if memoized is not None:
+                results[institution], stage_of[institution] = tuple(json.loads(memoized)), "memo"
+                continue
+
+            # Embed the same normalized string the memo is keyed on, so a memo hit equals a fresh lookup.
+            pending[normalized].append(institution)
+
+        matches = assigner.embedding_match_many(list(pending), threshold)
+        for normalized, waiting in pending.items():
+            match = matches.get(normalized)
+            if match is not None:
+                self.memo.set(memo_prefix + normalized, json.dumps(match))
+            for institution in waiting:
+                results[institution] = match or (None, None)
+                stage_of[institution] = "embedding"
+
+        for institution, count in occurrences.items():
+            self.stats[stage_of[institution]] += count
+        return results
+
+    def report(self):
+        total = sum(self.stats.values())
+        if not total:
+            return self.stats
+        summary = ", ".join(f"{stage} {count} ({count / total:.0%})" for stage, count in self.stats.items())
+        print(f"📊 Institution lookups: {total} — {summary}")
+        return self.stats
 
 
 class CollegeTierAssigner:
@@ -11,11 +133,127 @@ class CollegeTierAssigner:
         "BITS": "Birla Institute of Technology and Science"
     }
 
-    def __init__(self, csv_path):
+    def __init__(self, csv_path, batch_size=256, model_name='all-MiniLM-L6-v2', cache_dir=None, backend=None,
+                 require_parity=True):
+        self.batch_size = batch_size
+        self.model_name = model_name
+        # "torch" runs sentence-transformers; "onnx" runs an int8-quantized export through ONNX Runtime.
+        self.ENCODER_BACKEND = backend or os.getenv("TIER_ENCODER_BACKEND", "torch")
+        self.ENCODER_THREADS = int(os.getenv("TIER_ENCODER_THREADS", "0")) or None
+        self.cache_dir = cache_dir or os.getenv(
+            "TIER_EMBEDDING_CACHE_DIR",
+            os.path.join(os.path.dirname(os.path.abspath(csv_path)), ".embedding_cache")
+        )
+        # "exact" always brute-forces, "ann" always uses the IVF index, "auto" switches at ANN_MIN_SIZE colleges.
+        # Exact is the default: check ann_recall() reaches 0.99 at your ANN_NPROBE before switching.
+        self.SEARCH_MODE = os.getenv("TIER_SEARCH_MODE", "exact").lower()
+        self.ANN_MIN_SIZE = int(os.getenv("TIER_ANN_MIN_SIZE", "20000"))
+        self.ANN_NPROBE = int(os.getenv("TIER_ANN_NPROBE", "8"))
+        self.ANN_RERANK = int(os.getenv("TIER_ANN_RERANK", "10"))
+        self._encoder = None
         self.college_tiers = self.load_college_tiers(csv_path)
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.college_names = list(self.college_tiers.keys())
-        self.college_embeddings = self.model.encode(self.college_names, convert_to_tensor=True, show_progress_bar=False)
+        self.csv_hash = self.hash_csv(csv_path)
+        if self.ENCODER_BACKEND != "torch" and require_parity and not self.parity_passed():
+            print(f"⚠️ No passing parity check for the {self.ENCODER_BACKEND} encoder on this CSV; using torch. "
+                  f"Run `python -m src.tier_assignment.parity` to enable it.")
+            self.ENCODER_BACKEND = "torch"
+        self.college_names, self.college_embeddings = self.load_college_embeddings()
+        self.ann_index = self.load_ann_index()
+        self.resolver = InstitutionResolver(self)
+
+    @property
+    def encoder(self):
+        # Loaded on first use: a warm start only needs the memory-mapped college matrix.
+        if self._encoder is None:
+            self._encoder = create_encoder(
+                self.ENCODER_BACKEND, self.model_name, threads=self.ENCODER_THREADS, batch_size=self.batch_size
+            )
+        return self._encoder
+
+    def hash_csv(self, csv_path):
+        with open(csv_path, mode='rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    @property
+    def cache_key(self):
+        model_slug = self.model_name.replace('/', '_')
+        # Quantized backends produce slightly different vectors, so they get their own matrix.
+        if self.ENCODER_BACKEND != "torch":
+            model_slug = f"{model_slug}-{self.ENCODER_BACKEND}"
+        return f"{model_slug}-{self.csv_hash[:16]}"
+
+    @property
+    def parity_path(self):
+        return os.path.join(self.cache_dir, f"{self.cache_key}.parity.json")
+
+    def parity_passed(self):
+        """Whether src.tier_assignment.parity last passed for this backend, model and CSV."""
+        try:
+            with open(self.parity_path, mode='r', encoding='utf-8') as f:
+                return json.load(f).get("passed") is True
+        except (OSError, ValueError):
+            return False
+
+    def load_college_embeddings(self):
+        """Load the normalized college matrix zero-copy from disk, building it if the CSV or model changed."""
+        matrix_path = os.path.join(self.cache_dir, f"{self.cache_key}.npy")
+        names_path = os.path.join(self.cache_dir, f"{self.cache_key}.names.json")
+        college_names = list(self.college_tiers.keys())
+
+        if os.path.exists(matrix_path) and os.path.exists(names_path):
+            try:
+                with open(names_path, mode='r', encoding='utf-8') as f:
+                    cached_names = json.load(f)
+                embeddings = np.load(matrix_path, mmap_mode='r')
+                if cached_names == college_names and embeddings.shape[0] == len(college_names):
+                    return cached_names, embeddings
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable embedding cache {matrix_path}: {e}")
+
+        print(f"Encoding {len(college_names)} colleges with {self.model_name} ({self.ENCODER_BACKEND})...")
+        embeddings = self.encode(college_names)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Write to temporary files and rename, so concurrent workers never see a partial matrix.
+            tmp_suffix = f".{os.getpid()}.tmp"
+            with open(matrix_path + tmp_suffix, mode='wb') as f:
+                np.save(f, embeddings)
+            with open(names_path + tmp_suffix, mode='w', encoding='utf-8') as f:
+                json.dump(college_names, f, ensure_ascii=False)
+            os.replace(names_path + tmp_suffix, names_path)
+            os.replace(matrix_path + tmp_suffix, matrix_path)
+            embeddings = np.load(matrix_path, mmap_mode='r')
+        except OSError as e:
+            print(f"Could not persist embedding cache to {self.cache_dir}: {e}")
+        return college_names, embeddings
+
+    def load_ann_index(self):
+        """Load or build the IVF index over the college matrix when the configured search mode calls for one."""
+        use_ann = self.SEARCH_MODE == "ann" or (
+            self.SEARCH_MODE == "auto" and len(self.college_names) >= self.ANN_MIN_SIZE
+        )
+        if not use_ann or not len(self.college_names):
+            return None
+
+        index_path = os.path.join(self.cache_dir, f"{self.cache_key}.ivf.npz")
+        if os.path.exists(index_path):
+            try:
+                index = IVFIndex.load(index_path)
+                if len(index.ids) == len(self.college_names):
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable ANN index {index_path}: {e}")
+
+        print(f"Building ANN index over {len(self.college_names)} colleges...")
+        index = IVFIndex.build(self.college_embeddings)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            index.save(tmp_path)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            print(f"Could not persist ANN index to {self.cache_dir}: {e}")
+        return index
 
     def load_college_tiers(self, csv_path):
         college_tiers = {}
@@ -32,33 +270,76 @@ class CollegeTierAssigner:
             institution_name = institution_name.replace(abbreviation, full_name)
         return institution_name
 
-    def get_best_match(self, institution, threshold=0.8):
-        if not institution:
-            return None, None
+    def encode(self, texts):
+        """Encode in batches to L2-normalized float32 rows, so cosine similarity is a dot product."""
+        return self.encoder.encode(texts)
 
+    def prepare_query(self, institution):
         institution = self.expand_abbreviations(institution)
-
         if 'school' in institution.lower():
             print(f"Skipping '{institution}' as it contains 'school' in its name.")
-            return None, None
+            return None
+        return institution
 
+    def search(self, queries, exact=False):
+        """Return the best college index and cosine score for each query string.
+
+        Uses the ANN index when one is loaded, unless `exact` forces brute-force search.
+        """
+        best_idx = np.empty(len(queries), dtype=np.int64)
+        best_scores = np.empty(len(queries), dtype=np.float32)
+        for start in range(0, len(queries), self.batch_size * 16):
+            chunk = self.encode(queries[start:start + self.batch_size * 16])
+            if self.ann_index is not None and not exact:
+                idx, chunk_scores = self.ann_index.search(
+                    chunk, self.college_embeddings, nprobe=self.ANN_NPROBE, rerank=self.ANN_RERANK
+                )
+            else:
+                scores = chunk @ self.college_embeddings.T
+                idx = scores.argmax(axis=1)
+                chunk_scores = scores[np.arange(len(chunk)), idx]
+            best_idx[start:start + len(chunk)] = idx
+            best_scores[start:start + len(chunk)] = chunk_scores
+        return best_idx, best_scores
+
+    def ann_recall(self, queries):
+        """Fraction of queries where ANN search agrees with exact search, for tuning TIER_ANN_NPROBE."""
+        if self.ann_index is None or not queries:
+            return 1.0
+        return recall(self.ann_index, self.encode(queries), self.college_embeddings,
+                      nprobe=self.ANN_NPROBE, rerank=self.ANN_RERANK)
+
+    def embedding_match_many(self, queries, threshold=0.8):
+        """Match prepared query strings against the college matrix in large batches.
+
+        Returns {query: (matched_name, tier)}; queries that could not be encoded are left out.
+        """
+        matches = {}
+        if not queries:
+            return matches
         try:
-            institution_embedding = self.model.encode(institution, convert_to_tensor=True)
-            similarities = util.cos_sim(institution_embedding, self.college_embeddings)[0]
-            best_idx = np.argmax(similarities)
-            score = similarities[best_idx].item()
-            matched_name = self.college_names[best_idx]
-            print(f"Trying match: '{institution}' → '{matched_name}' (Score: {score*100:.2f})")
+            best_idx, best_scores = self.search(queries)
+        except Exception as e:
+            print(f"Error encoding {len(queries)} institutions: {e}")
+            return matches
 
+        for query, idx, score in zip(queries, best_idx, best_scores):
+            matched_name = self.college_names[idx]
             if score >= threshold:
-                return matched_name, self.college_tiers[matched_name]
+                matches[query] = (matched_name, self.college_tiers[matched_name])
             else:
-                print(f"No match for '{institution}' (best match: '{matched_name}', score: {score*100:.2f})")
-                return None, None
+                print(f"No match for '{query}' (best match: '{matched_name}', score: {score*100:.2f})")
+                matches[query] = (None, None)
+        return matches
 
-        except Exception as e:
-            print(f"Error encoding institution '{institution}': {e}")
+    def match_many(self, institutions, threshold=0.8):
+        """Resolve many institution strings in one pass. Returns {institution: (matched_name, tier)}."""
+        return self.resolver.resolve_many(institutions, threshold)
+
+    def get_best_match(self, institution, threshold=0.8):
+        if not institution:
             return None, None
+        return self.match_many([institution], threshold)[institution]
 
 
 class ResumeProcessor:
@@ -86,62 +367,75 @@ class ResumeProcessor:
                 return "Tier1"
         return "Tier2"
 
+    def load_resume(self, resume_path):
+        try:
+            with open(resume_path, mode='r', encoding='utf-8') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, FileNotFoundError) as e:
+            print(f"Error reading {resume_path}: {e}")
+            return None
+
+    def collect_institutions(self, resumes):
+        return [
+            (edu.get('institution') or '').strip()
+            for resume_data in resumes
+            for edu in resume_data.get('education', [])
+            if isinstance(edu, dict)
+        ]
+
+    def assign_tiers(self, resume_data, matches):
+        for edu in resume_data.get('education', []):
+            if not isinstance(edu, dict):
+                continue
+            institution = (edu.get('institution') or '').strip()
+            if not institution:
+                continue
+            matched_name, tier = matches.get(institution, (None, None))
+            if tier:
+                edu['tier'] = tier
+                if self.include_debug:
+                    edu['matched_institution'] = matched_name
+            else:
+                edu['tier'] = 'Tier3'
+                if self.include_debug:
+                    edu['matched_institution'] = 'No Match'
+
+        location = (resume_data.get('location') or '').strip()
+        resume_data['location_tier'] = self.get_location_tier(location)
+        return resume_data
+
     def process_resumes(self):
         os.makedirs(self.output_dir, exist_ok=True)
         json_files = self.get_json_files()
 
+        loaded = []
         for file in json_files:
             resume_path = os.path.join(self.resume_dir, file)
             print(f"Processing file: {resume_path}")
+            resume_data = self.load_resume(resume_path)
+            if resume_data is not None:
+                loaded.append((file, resume_data))
 
-            try:
-                with open(resume_path, mode='r', encoding='utf-8') as f:
-                    resume_data = json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError) as e:
-                print(f"Error reading {resume_path}: {e}")
-                continue
-
-            updated = False
-
-            for edu in resume_data.get('education', []):
-                institution = edu.get('institution', '').strip()
-                if institution:
-                    matched_name, tier = self.college_assigner.get_best_match(institution)
-                    if tier:
-                        edu['tier'] = tier
-                        if self.include_debug:
-                            edu['matched_institution'] = matched_name
-                        updated = True
-                    else:
-                        edu['tier'] = 'Tier3'
-                        if self.include_debug:
-                            edu['matched_institution'] = 'No Match'
-                        updated = True
-
-            location = (resume_data.get('location') or '').strip()
-
-            resume_data['location_tier'] = self.get_location_tier(location)
-            updated = True
+        # One batched match for every institution in the run instead of one encode per entry.
+        matches = self.college_assigner.match_many(self.collect_institutions(data for _, data in loaded))
 
+        for file, resume_data in loaded:
+            self.assign_tiers(resume_data, matches)
+            output_path = os.path.join(self.output_dir, file)
             try:
-                relative_path = os.path.relpath(resume_path, self.resume_dir)
-                output_path = os.path.join(self.output_dir, relative_path)
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
                 with open(output_path, mode='w', encoding='utf-8') as f:
                     json.dump(resume_data, f, indent=4, ensure_ascii=False)
-                print(f"{'✅ Updated' if updated else '❌ Skipped'}: {file}")
+                print(f"✅ Updated: {file}")
             except Exception as e:
                 print(f"Error writing to {output_path}: {e}")
 
+        self.college_assigner.resolver.report()
+
 
 if __name__ == "__main__":
-    csv_path = "/home/shtlp_0152/Desktop/project 1/data-ingestion-pipeline/src/tier_assignment/college_tiers.csv"
-    resume_dir = "/home/shtlp_0152/Desktop/project 1/data-ingestion-pipeline/data/standardized_resumes"
-    output_dir = "/home/shtlp_0152/Desktop/project 1/data-ingestion-pipeline/data/standardized_resumewithtierlevels"
+    from src.tier_assignment.tier_runner import TierRunner
 
     try:
-        college_assigner = CollegeTierAssigner(csv_path)
-        processor = ResumeProcessor(resume_dir, output_dir, college_assigner, include_debug=True)
-        processor.process_resumes()
+        TierRunner().run()
     except Exception as e:
         print(f"Script failed: {e}")
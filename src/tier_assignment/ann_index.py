@@ -0,0 +1,121 @@
+import numpy as np
+
+
+class IVFIndex:
+    """Inverted-file index over L2-normalized vectors, with int8 codes for candidate scoring.
+
+    Vectors are clustered with spherical k-means. A query scans only the `nprobe` closest
+    clusters using the int8 codes, then re-ranks its top `rerank` candidates against the
+    exact float vectors. Raising `nprobe` trades latency for recall; nprobe == n_lists is
+    exhaustive over the quantized codes.
+    """
+
+    def __init__(self, centroids, offsets, ids, codes, scales):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, iterations=10, seed=0, chunk_size=8192):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        n_lists = min(n, n_lists or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, size=n_lists, replace=False)].copy()
+
+        assignments = np.zeros(n, dtype=np.int64)
+        for _ in range(iterations):
+            for start in range(0, n, chunk_size):
+                assignments[start:start + chunk_size] = (vectors[start:start + chunk_size] @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            counts = np.bincount(assignments, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty clusters from random points instead of leaving dead lists.
+                sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        for start in range(0, n, chunk_size):
+            assignments[start:start + chunk_size] = (vectors[start:start + chunk_size] @ centroids.T).argmax(axis=1)
+
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+        scales = np.maximum(np.abs(vectors).max(axis=0), 1e-12) / 127.0
+        codes = np.clip(np.rint(vectors[order] / scales), -127, 127).astype(np.int8)
+        return cls(centroids.astype(np.float32), offsets, order.astype(np.int64), codes, scales.astype(np.float32))
+
+    def save(self, path):
+        with open(path, mode="wb") as f:
+            np.savez(f, centroids=self.centroids, offsets=self.offsets, ids=self.ids,
+                     codes=self.codes, scales=self.scales)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["centroids"], data["offsets"], data["ids"], data["codes"], data["scales"])
+
+    def search(self, queries, exact_vectors, nprobe=8, rerank=10):
+        """Return (best index, exact cosine score) per query row.
+
+        Work is batched per inverted list rather than per query: every query probing a list is
+        scored against it in one matmul, and its top `rerank` hits fill that probe's slots in a
+        (queries x nprobe * rerank) candidate table that is re-ranked exactly in one pass.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        n_queries = len(queries)
+        nprobe = max(1, min(nprobe, self.n_lists))
+        rerank = max(1, rerank)
+        centroid_scores = queries @ self.centroids.T
+        if nprobe < self.n_lists:
+            probes = np.argpartition(-centroid_scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.n_lists), (n_queries, self.n_lists))
+
+        # Scaling the query instead of the codes keeps the dequantization out of the inner product.
+        scaled = queries * self.scales
+        cand_scores = np.full((n_queries, nprobe * rerank), -np.inf, dtype=np.float32)
+        cand_ids = np.zeros((n_queries, nprobe * rerank), dtype=np.int64)
+        # Group (query, probe slot) pairs by the list they probe.
+        flat_lists = probes.ravel()
+        order = np.argsort(flat_lists, kind="stable")
+        bounds = np.searchsorted(flat_lists[order], np.arange(self.n_lists + 1))
+        for l in range(self.n_lists):
+            start, stop = self.offsets[l], self.offsets[l + 1]
+            entries = order[bounds[l]:bounds[l + 1]]
+            if start == stop or not len(entries):
+                continue
+            rows, slots = np.divmod(entries, nprobe)
+            block = scaled[rows] @ self.codes[start:stop].astype(np.float32).T
+            k = min(rerank, stop - start)
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k] if k < stop - start else \
+                np.broadcast_to(np.arange(k), (len(rows), k))
+            columns = slots[:, None] * rerank + np.arange(k)
+            cand_scores[rows[:, None], columns] = np.take_along_axis(block, top, axis=1)
+            cand_ids[rows[:, None], columns] = self.ids[start + top]
+
+        k = min(rerank, cand_scores.shape[1])
+        best = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+        valid = np.isfinite(np.take_along_axis(cand_scores, best, axis=1))
+        ids = np.take_along_axis(cand_ids, best, axis=1)
+        exact = np.einsum("qkd,qd->qk", np.asarray(exact_vectors[ids.ravel()], dtype=np.float32)
+                          .reshape(n_queries, k, -1), queries)
+        exact[~valid] = -np.inf
+        winner = exact.argmax(axis=1)
+        rows = np.arange(n_queries)
+        return ids[rows, winner], exact[rows, winner].astype(np.float32)
+
+
+def recall(index, queries, exact_vectors, nprobe=8, rerank=10):
+    """Fraction of queries whose ANN answer matches brute-force search, for tuning nprobe."""
+    queries = np.asarray(queries, dtype=np.float32)
+    exact_best = (queries @ np.asarray(exact_vectors, dtype=np.float32).T).argmax(axis=1)
+    ann_best, _ = index.search(queries, exact_vectors, nprobe=nprobe, rerank=rerank)
+    return float((ann_best == exact_best).mean()) if len(queries) else 1.0
@@ -0,0 +1,109 @@
+import os
+import numpy as np
+
+# sentence-transformers/all-MiniLM-L6-v2 publishes pre-quantized ONNX exports; avx2 runs on any x86-64 worker.
+DEFAULT_ONNX_FILE = "onnx/model_quint8_avx2.onnx"
+MAX_SEQ_LENGTH = 256
+
+
+def normalize_rows(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEncoder:
+    """Full-precision PyTorch encoder via sentence-transformers."""
+
+    name = "torch"
+
+    def __init__(self, model_name, threads=None, batch_size=256):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, texts):
+        embeddings = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+class OnnxEncoder:
+    """int8-quantized ONNX Runtime encoder: tokenizer + transformer + mean pooling, without importing torch.
+
+    Model files come from TIER_ONNX_MODEL_DIR when set (a directory with tokenizer.json and the
+    .onnx file), otherwise from the Hugging Face hub cache.
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, model_name, threads=None, batch_size=256):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        onnx_file = os.getenv("TIER_ONNX_FILE", DEFAULT_ONNX_FILE)
+        model_dir = os.getenv("TIER_ONNX_MODEL_DIR")
+        if model_dir:
+            tokenizer_path = os.path.join(model_dir, "tokenizer.json")
+            model_path = os.path.join(model_dir, onnx_file)
+        else:
+            from huggingface_hub import hf_hub_download
+
+            repo_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+            tokenizer_path = hf_hub_download(repo_id, "tokenizer.json")
+            model_path = hf_hub_download(repo_id, onnx_file)
+
+        self.batch_size = batch_size
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts):
+        chunks = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self.tokenizer.encode_batch(list(texts[start:start + self.batch_size]))
+            mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+            # Mean pooling over real tokens, as in the sentence-transformers pooling layer.
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            chunks.append(normalize_rows(pooled))
+        if not chunks:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(chunks)
+
+
+ENCODER_BACKENDS = {
+    "torch": SentenceTransformerEncoder,
+    "onnx": OnnxEncoder,
+}
+
+
+def create_encoder(backend, model_name, threads=None, batch_size=256):
+    try:
+        encoder_class = ENCODER_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown encoder backend '{backend}', expected one of {sorted(ENCODER_BACKENDS)}")
+    return encoder_class(model_name, threads=threads, batch_size=batch_size)
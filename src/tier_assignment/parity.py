@@ -0,0 +1,88 @@
+import os
+import json
+import numpy as np
+from src.tier_assignment.add_tiers import CollegeTierAssigner, ResumeProcessor
+
+
+def collect_queries(assigner, resume_dir, sample_size=500, seed=0):
+    """Institution strings from standardized resumes, falling back to a sample of catalog names."""
+    queries = []
+    if resume_dir and os.path.isdir(resume_dir):
+        processor = ResumeProcessor(resume_dir, None, assigner)
+        resumes = filter(None, (processor.load_resume(os.path.join(resume_dir, f)) for f in processor.get_json_files()))
+        queries = [assigner.prepare_query(i) for i in set(processor.collect_institutions(resumes)) if i]
+        queries = sorted(q for q in queries if q)
+    if not queries:
+        rng = np.random.default_rng(seed)
+        names = assigner.college_names
+        picked = rng.choice(len(names), size=min(sample_size, len(names)), replace=False)
+        # Lower-cased so the comparison exercises the embedding, not an exact string hit.
+        queries = [names[i].lower() for i in picked]
+    return queries
+
+
+def compare_backends(csv_path, resume_dir=None, candidate="onnx", reference="torch",
+                     threshold=0.8, min_cosine=0.98, min_agreement=0.99):
+    """Check that `candidate` assigns the same tiers as `reference` on the same queries.
+
+    Embedding search is compared directly, bypassing the exact/fuzzy/memo stages, which do not
+    depend on the encoder. Returns a report dict with "passed". The outcome is recorded next to
+    the candidate's embedding cache; CollegeTierAssigner only uses a non-torch backend after a pass.
+    """
+    ref = CollegeTierAssigner(csv_path, backend=reference, require_parity=False)
+    cand = CollegeTierAssigner(csv_path, backend=candidate, require_parity=False)
+    queries = collect_queries(ref, resume_dir)
+
+    cosines = np.sum(ref.encode(queries) * cand.encode(queries), axis=1)
+    ref_matches = ref.embedding_match_many(queries, threshold)
+    cand_matches = cand.embedding_match_many(queries, threshold)
+
+    ref_tiers = [ref_matches[q][1] or "Tier3" for q in queries]
+    cand_tiers = [cand_matches[q][1] or "Tier3" for q in queries]
+    disagreements = [(q, a, b) for q, a, b in zip(queries, ref_tiers, cand_tiers) if a != b]
+    agreement = 1 - len(disagreements) / len(queries) if queries else 1.0
+
+    report = {
+        "queries": len(queries),
+        "min_cosine": float(cosines.min()) if len(queries) else 1.0,
+        "mean_cosine": float(cosines.mean()) if len(queries) else 1.0,
+        "tier_agreement": agreement,
+        "disagreements": disagreements,
+    }
+    report["passed"] = report["min_cosine"] >= min_cosine and agreement >= min_agreement
+    if reference == "torch" and candidate != "torch":
+        record_parity(cand, report)
+    return report
+
+
+def record_parity(assigner, report):
+    record = {key: value for key, value in report.items() if key != "disagreements"}
+    try:
+        os.makedirs(assigner.cache_dir, exist_ok=True)
+        with open(assigner.parity_path, mode='w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2)
+    except OSError as e:
+        print(f"Could not record parity result in {assigner.cache_dir}: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Compare tier assignments between two encoder backends")
+    parser.add_argument("--csv", default=os.getenv("TIER_CSV_PATH", "src/tier_assignment/college_tiers.csv"))
+    parser.add_argument("--resume-dir", default=os.getenv("TIER_INPUT_DIR", "data/standardized_resumes"))
+    parser.add_argument("--candidate", default="onnx")
+    parser.add_argument("--reference", default="torch")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    report = compare_backends(args.csv, args.resume_dir, args.candidate, args.reference,
+                              min_cosine=args.min_cosine, min_agreement=args.min_agreement)
+    for query, expected, got in report["disagreements"]:
+        print(f"⚠️ '{query}': {args.reference} → {expected}, {args.candidate} → {got}")
+    print(f"📊 {report['queries']} queries, cosine min {report['min_cosine']:.4f} / mean {report['mean_cosine']:.4f}, "
+          f"tier agreement {report['tier_agreement']:.2%}")
+    print("✅ Backends agree" if report["passed"] else "❌ Backends diverge beyond tolerance")
+    sys.exit(0 if report["passed"] else 1)
@@ -0,0 +1,199 @@
+import os
+import json
+import asyncio
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from src.tier_assignment.add_tiers import CollegeTierAssigner, InstitutionResolver, ResumeProcessor
+from src.utils.progress import ProgressTracker
+
+# One ResumeProcessor per worker process, built by init_worker and reused for every shard it receives.
+_processor = None
+_processor_config = None
+
+
+def init_worker(csv_path, include_debug):
+    global _processor, _processor_config
+    # Celery workers tier many chunks in one process; keep the loaded assigner between them.
+    if _processor is not None and _processor_config == (csv_path, include_debug):
+        return
+    assigner = CollegeTierAssigner(csv_path)
+    # Load the encoder now rather than inside the first shard.
+    assigner.encoder
+    _processor = ResumeProcessor(None, None, assigner, include_debug=include_debug)
+    _processor_config = (csv_path, include_debug)
+
+
+def process_shard(paths, serialize=True, return_docs=False):
+    """Tier one shard of resume files.
+
+    Returns ([(name, serialized JSON, document, error)], stage counts); the JSON is only built when
+    `serialize` is set and the document only sent back when `return_docs` is set.
+    """
+    resolver = _processor.college_assigner.resolver
+    resolver.stats = dict.fromkeys(InstitutionResolver.STAGES, 0)
+
+    results = []
+    loaded = []
+    for path in paths:
+        resume_data = _processor.load_resume(path)
+        if resume_data is None:
+            results.append((os.path.basename(path), None, None, "unreadable JSON"))
+        else:
+            loaded.append((os.path.basename(path), resume_data))
+
+    matches = _processor.college_assigner.match_many(_processor.collect_institutions(data for _, data in loaded))
+    for name, resume_data in loaded:
+        try:
+            _processor.assign_tiers(resume_data, matches)
+            payload = json.dumps(resume_data, ensure_ascii=False, separators=(",", ":")) if serialize else None
+            results.append((name, payload, resume_data if return_docs else None, None))
+        except Exception as e:
+            results.append((name, None, None, str(e)))
+    return results, resolver.stats
+
+
+class TierRunner:
+    """Assigns tiers to standardized resumes in shards spread over a process pool.
+
+    Workers each load the college assigner once and share the memory-mapped college matrix;
+    a single writer thread in the parent does all output writes, to JSON files and/or Mongo.
+    """
+
+    def __init__(self, csv_path=None, resume_dir=None, output_dir=None, include_debug=True):
+        self.CSV_PATH = csv_path or os.getenv("TIER_CSV_PATH", "src/tier_assignment/college_tiers.csv")
+        self.INPUT_DIR = Path(resume_dir or os.getenv("TIER_INPUT_DIR", "data/standardized_resumes"))
+        self.OUTPUT_DIR = Path(output_dir or os.getenv("TIER_OUTPUT_DIR", "data/standardized_resumewithtierlevels"))
+        self.WORKERS = int(os.getenv("TIER_WORKERS", str(os.cpu_count() or 1)))
+        self.SHARD_SIZE = int(os.getenv("TIER_SHARD_SIZE", "256"))
+        self.MONGO_SINK = os.getenv("TIER_MONGO_SINK", "false").lower() == "true"
+        self.JSON_OUTPUT = os.getenv("TIER_JSON_OUTPUT", "true").lower() == "true"
+        self.include_debug = include_debug
+
+    def get_json_files(self):
+        return sorted(f for f in self.INPUT_DIR.glob("*.json") if f.is_file())
+
+    def shard(self, files):
+        # Smaller shards when there are few files, so every worker gets some.
+        size = max(1, min(self.SHARD_SIZE, -(-len(files) // max(1, self.WORKERS))))
+        return [[str(f) for f in files[i:i + size]] for i in range(0, len(files), size)]
+
+    def warm_cache(self):
+        """Build the embedding and ANN caches once up front, so workers only ever memory-map them."""
+        CollegeTierAssigner(self.CSV_PATH)
+
+    def write_json(self, name, payload):
+        output_path = self.OUTPUT_DIR / name
+        try:
+            with open(output_path, mode='w', encoding='utf-8') as f:
+                f.write(payload)
+            return True
+        except OSError as e:
+            print(f"Error writing to {output_path}: {e}")
+            return False
+
+    def write_outputs(self, pending):
+        drained = threading.Event()
+        if self.MONGO_SINK:
+            try:
+                asyncio.run(self.write_outputs_to_sink(pending, drained))
+            except Exception as e:
+                print(f"❌ Mongo sink failed, continuing with JSON output only: {e}")
+        # Keep consuming after a sink failure, so the producer never blocks on a full queue.
+        while not drained.is_set():
+            item = pending.get()
+            if item is None:
+                return
+            name, payload, _ = item
+            if payload is not None and self.write_json(name, payload):
+                print(f"✅ Updated: {name}")
+
+    async def write_outputs_to_sink(self, pending, drained):
+        from src.db_manager.mongo_sink import AsyncMongoSink
+
+        async with AsyncMongoSink() as sink:
+            while True:
+                item = await asyncio.to_thread(pending.get)
+                if item is None:
+                    drained.set()
+                    return
+                name, payload, doc = item
+                if payload is not None:
+                    self.write_json(name, payload)
+                await sink.put(doc, name)
+                print(f"✅ Updated: {name}")
+
+    def iter_shard_results(self, shards):
+        # Daemonic processes (e.g. Celery prefork workers) cannot fork children; run shards in-process there.
+        # Celery gets its parallelism from tier_chunk_task fan-out instead.
+        if multiprocessing.current_process().daemon or self.WORKERS <= 1:
+            init_worker(self.CSV_PATH, self.include_debug)
+            for shard in shards:
+                yield process_shard(shard, self.JSON_OUTPUT, self.MONGO_SINK)
+            return
+
+        self.warm_cache()
+        with ProcessPoolExecutor(
+            max_workers=min(self.WORKERS, len(shards)),
+            initializer=init_worker,
+            initargs=(self.CSV_PATH, self.include_debug)
+        ) as pool:
+            futures = [pool.submit(process_shard, shard, self.JSON_OUTPUT, self.MONGO_SINK) for shard in shards]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def process_resumes(self, files, on_result=None):
+        """Tier `files`, calling on_result(name, status, error) as each file is finished."""
+        self.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        shards = self.shard(files)
+        totals = dict.fromkeys(InstitutionResolver.STAGES, 0)
+        if not shards:
+            return totals
+
+        pending = queue.Queue(maxsize=self.SHARD_SIZE * 4)
+        writer = threading.Thread(target=self.write_outputs, args=(pending,), daemon=True)
+        writer.start()
+        try:
+            for results, stats in self.iter_shard_results(shards):
+                for stage, count in stats.items():
+                    totals[stage] += count
+                for name, payload, doc, error in results:
+                    if error:
+                        print(f"❌ Failed to tier {name}: {error}")
+                    else:
+                        pending.put((name, payload, doc))
+                    if on_result:
+                        on_result(name, "error" if error else "done", error)
+        finally:
+            pending.put(None)
+            writer.join()
+
+        total = sum(totals.values())
+        if total:
+            summary = ", ".join(f"{stage} {count} ({count / total:.0%})" for stage, count in totals.items())
+            print(f"📊 Institution lookups: {total} — {summary}")
+        return totals
+
+    def run(self):
+        files = self.get_json_files()
+        print(f"📂 Found {len(files)} resumes to tier across {self.WORKERS} worker(s).\n")
+        self.process_resumes(files)
+
+    def run_with_progress(self, task_id: str):
+        files = self.get_json_files()
+        progress = ProgressTracker(task_id)
+        progress.start(phase="tiering", total=len(files), started_at=datetime.utcnow().isoformat())
+
+        def on_result(name, status, error):
+            progress.file_finished(name, status, error=error, counted=not error)
+
+        lookups = self.process_resumes(files, on_result=on_result)
+
+        progress.finish("done", lookups=lookups, finished_at=datetime.utcnow().isoformat())
+
+
+if __name__ == "__main__":
+    TierRunner().run()
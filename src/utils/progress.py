@@ -1,11 +1,225 @@
-import redis
+import os
 import json
+import asyncio
+import redis
+from redis import asyncio as aioredis
+
+pool = redis.ConnectionPool(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", "6379")),
+    db=int(os.getenv("PROGRESS_REDIS_DB", "1")),
+)
+redis_client = redis.Redis(connection_pool=pool)
+async_redis_client = aioredis.Redis(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", "6379")),
+    db=int(os.getenv("PROGRESS_REDIS_DB", "1")),
+)
+
+# Seconds to keep a task's progress after its last write; 0 keeps it forever.
+PROGRESS_TTL = int(os.getenv("PROGRESS_TTL_SECONDS", "0"))
+# Event streams batch deltas arriving within this window and send a comment line when idle this long.
+COALESCE_SECONDS = float(os.getenv("PROGRESS_COALESCE_SECONDS", "0.25"))
+HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+# Streams close when an unknown task shows no progress this long, when a task goes quiet this long
+# (e.g. its worker died), and in any case after the maximum lifetime.
+PENDING_TIMEOUT_SECONDS = float(os.getenv("PROGRESS_PENDING_TIMEOUT_SECONDS", "60"))
+MAX_IDLE_SECONDS = float(os.getenv("PROGRESS_MAX_IDLE_SECONDS", "900"))
+MAX_STREAM_SECONDS = float(os.getenv("PROGRESS_MAX_STREAM_SECONDS", "21600"))
+TERMINAL_STATUSES = {"done", "error"}
+
+
+def meta_key(task_id):
+    return f"progress:{task_id}"
+
+
+def files_key(task_id):
+    return f"progress:{task_id}:files"
+
+
+def order_key(task_id):
+    return f"progress:{task_id}:order"
+
+
+def events_channel(task_id):
+    return f"progress:{task_id}:events"
+
+
+def encode_fields(data: dict):
+    return {key: json.dumps(value, ensure_ascii=False, default=str) for key, value in data.items()}
+
+
+def decode_value(raw):
+    text = raw.decode("utf-8") if isinstance(raw, bytes) else raw
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+class ProgressTracker:
+    """Records a task's progress as small deltas instead of rewriting one growing JSON blob.
+
+    Task fields and counters live in a hash, each file's status in a second hash, and the order
+    files were first seen in a list. Every call is one pipelined round-trip, which also publishes
+    the delta for progress_events subscribers.
+    """
+
+    def __init__(self, task_id: str, ttl: int = PROGRESS_TTL, client=None, registered=()):
+        self.task_id = task_id
+        self.ttl = ttl
+        self.client = client or redis_client
+        # Files another process already added to the order list, e.g. a job's dispatcher.
+        self.seen = set(registered)
+
+    def write(self, meta=None, increments=None, files=None, reset_files=False):
+        pipe = self.client.pipeline(transaction=False)
+        if reset_files:
+            pipe.delete(files_key(self.task_id), order_key(self.task_id))
+        if meta:
+            pipe.hset(meta_key(self.task_id), mapping=encode_fields(meta))
+        for field, amount in (increments or {}).items():
+            pipe.hincrby(meta_key(self.task_id), field, amount)
+        for name, status in (files or {}).items():
+            if name not in self.seen:
+                self.seen.add(name)
+                pipe.rpush(order_key(self.task_id), name)
+            pipe.hset(files_key(self.task_id), name, json.dumps(status, ensure_ascii=False, default=str))
+        if self.ttl:
+            for key in (meta_key(self.task_id), files_key(self.task_id), order_key(self.task_id)):
+                pipe.expire(key, self.ttl)
+        pipe.publish(events_channel(self.task_id), json.dumps({
+            "meta": meta or {},
+            "increments": list(increments or ()),
+            "files": list((files or {}).values()),
+            "reset": reset_files,
+        }, ensure_ascii=False, default=str))
+        pipe.execute()
+
+    def start(self, **fields):
+        self.write(meta={"task_id": self.task_id, "status": "in_progress", "completed": 0, **fields})
+
+    def update(self, **fields):
+        self.write(meta=fields)
+
+    def file_started(self, name: str):
+        self.write(meta={"current_file": name}, files={name: {"name": name, "status": "processing"}})
+
+    def file_finished(self, name: str, status: str, error: str = None, counted: bool = True):
+        entry = {"name": name, "status": status}
+        if error:
+            entry["error"] = error
+        self.write(
+            meta={"current_file": name},
+            increments={"completed": 1} if counted else None,
+            files={name: entry}
+        )
+
+    def finish(self, status: str = "done", **fields):
+        self.write(meta={"status": status, **fields})
 
-redis_client = redis.Redis(host="localhost", port=6379, db=1)
 
 def update_progress(task_id: str, data: dict):
-    redis_client.set(task_id, json.dumps(data))
+    """Merge `data` into the task's progress; a "files" list replaces the stored per-file statuses."""
+    data = dict(data)
+    files = data.pop("files", None)
+    if files is not None:
+        files = {entry["name"]: entry for entry in files}
+    ProgressTracker(task_id).write(meta=data, files=files, reset_files=files is not None)
+
+
+def get_progress(task_id: str, offset: int = 0, limit: int = None) -> dict:
+    """Assemble the task's progress view, with `limit` file statuses starting at `offset`."""
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(meta_key(task_id))
+    pipe.llen(order_key(task_id))
+    if limit != 0:
+        pipe.lrange(order_key(task_id), offset, -1 if limit is None else offset + limit - 1)
+    meta, files_total, *page = pipe.execute()
+    names = page[0] if page else []
+
+    if not meta:
+        # Progress written by older workers as a single JSON string.
+        raw = redis_client.get(task_id)
+        return json.loads(raw) if raw else {"status": "PENDING", "task_id": task_id}
+
+    progress = {key.decode("utf-8"): decode_value(value) for key, value in meta.items()}
+    statuses = redis_client.hmget(files_key(task_id), names) if names else []
+    progress["files"] = [decode_value(status) for status in statuses if status is not None]
+    progress["files_total"] = files_total
+    progress["files_offset"] = offset
+    return progress
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def progress_events(task_id: str, limit: int = None,
+                          coalesce: float = COALESCE_SECONDS, heartbeat: float = HEARTBEAT_SECONDS,
+                          pending_timeout: float = PENDING_TIMEOUT_SECONDS, max_idle: float = MAX_IDLE_SECONDS,
+                          max_lifetime: float = MAX_STREAM_SECONDS):
+    """Server-sent events for one task: a snapshot, then coalesced changes until the task finishes.
+
+    Each "progress" event carries only the fields and file statuses that changed since the last
+    one. Counters are re-read when they changed, so every value sent is absolute. A stream that
+    gives up before the task finishes ends with a "timeout" event saying why.
+    """
+    loop = asyncio.get_running_loop()
+    pubsub = async_redis_client.pubsub()
+    # Subscribe before taking the snapshot, so no change can fall between the two.
+    await pubsub.subscribe(events_channel(task_id))
+    try:
+        snapshot = await asyncio.to_thread(get_progress, task_id, 0, limit)
+        yield sse("snapshot", snapshot)
+        if snapshot.get("status") in TERMINAL_STATUSES:
+            return
+
+        fields, files, counters, reset = {}, {}, set(), False
+        first_pending = None
+        started = last_sent = last_change = loop.time()
+        # Unknown or expired ids never publish anything; give a queued task a short window to start.
+        unstarted = snapshot.get("status") == "PENDING"
+        idle_limit = pending_timeout if unstarted else max_idle
+        while True:
+            now = loop.time()
+            if first_pending is None and now - last_change >= idle_limit:
+                reason = "unknown or expired task" if unstarted else "no progress"
+                yield sse("timeout", {"reason": reason, "idle_seconds": round(now - last_change)})
+                return
+            if now - started >= max_lifetime:
+                yield sse("timeout", {"reason": "stream lifetime exceeded"})
+                return
+            wait = (first_pending + coalesce - now) if first_pending is not None else (last_sent + heartbeat - now)
+            wait = min(wait, last_change + idle_limit - now, started + max_lifetime - now)
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=max(wait, 0.01))
+            if message is not None:
+                delta = json.loads(message["data"])
+                if delta["reset"]:
+                    files, reset = {}, True
+                fields.update(delta["meta"])
+                counters.update(delta["increments"])
+                files.update((entry["name"], entry) for entry in delta["files"])
+                if first_pending is None:
+                    first_pending = loop.time()
+                last_change = loop.time()
+                unstarted, idle_limit = False, max_idle
 
-def get_progress(task_id: str) -> dict:
-    raw = redis_client.get(task_id)
-    return json.loads(raw) if raw else {"status": "PENDING", "task_id": task_id}
+            now = loop.time()
+            if first_pending is not None and now - first_pending >= coalesce:
+                if counters:
+                    names = sorted(counters)
+                    values = await async_redis_client.hmget(meta_key(task_id), names)
+                    fields.update((name, decode_value(value)) for name, value in zip(names, values) if value is not None)
+                yield sse("progress", {"fields": fields, "files": list(files.values()), "reset": reset})
+                if fields.get("status") in TERMINAL_STATUSES:
+                    return
+                fields, files, counters, reset = {}, {}, set(), False
+                first_pending = None
+                last_sent = now
+            elif first_pending is None and now - last_sent >= heartbeat:
+                yield ": heartbeat\n\n"
+                last_sent = now
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()